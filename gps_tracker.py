@@ -6,12 +6,299 @@ import json
 import time
 import logging
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional, NamedTuple
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Set, Tuple, Optional, NamedTuple
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
 import math
 
 logger = logging.getLogger(__name__)
 
+EARTH_RADIUS_M = 6371000  # Mean Earth radius used for haversine distances
+
+# Enhanced KML document template, built once at import. Only {content} is
+# large, so it is pre-split out and the prologue alone goes through .format().
+_ENHANCED_KML_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">
+<Document>
+    <name>🛡️ CYT Advanced Surveillance Detection Analysis</name>
+    <description><![CDATA[
+        <h2>📡 CYT Device Analysis Report</h2>
+        <p><b>Generated:</b> {timestamp}</p>
+        <p><b>Analysis:</b> Wireless device tracking and persistence analysis</p>
+        <p><b>GPS Locations:</b> {total_locations} monitoring locations</p>
+        <p><b>Persistent Devices:</b> {total_devices} devices detected</p>
+        <hr>
+        <h3>Visualization Features:</h3>
+        <ul>
+        <li>Color-coded device classifications</li>
+        <li>Location monitoring session data</li>
+        <li>Device movement correlation</li>
+        <li>Activity intensity mapping</li>
+        <li>Time-based pattern analysis</li>
+        </ul>
+        <p><i>KML visualization for Google Earth analysis.</i></p>
+    ]]></description>
+    
+    <!-- Location Styles -->
+    <Style id="locationStyle">
+        <IconStyle>
+            <color>ff00ff00</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/placemark_circle.png</href></Icon>
+            <scale>1.2</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="criticalLocationStyle">
+        <IconStyle>
+            <color>ff0000ff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/forbidden.png</href></Icon>
+            <scale>1.8</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="highThreatLocationStyle">
+        <IconStyle>
+            <color>ff0080ff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/caution.png</href></Icon>
+            <scale>1.5</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="mediumThreatLocationStyle">
+        <IconStyle>
+            <color>ff00ffff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/triangle.png</href></Icon>
+            <scale>1.3</scale>
+        </IconStyle>
+    </Style>
+    
+    <!-- Device Path Styles -->
+    <Style id="criticalDevicePathStyle">
+        <LineStyle>
+            <color>ff0000ff</color>
+            <width>5</width>
+        </LineStyle>
+    </Style>
+    
+    <Style id="highDevicePathStyle">
+        <LineStyle>
+            <color>ff0080ff</color>
+            <width>4</width>
+        </LineStyle>
+    </Style>
+    
+    <Style id="mediumDevicePathStyle">
+        <LineStyle>
+            <color>ff00ffff</color>
+            <width>3</width>
+        </LineStyle>
+    </Style>
+    
+    <Style id="devicePathStyle">
+        <LineStyle>
+            <color>7f00ffff</color>
+            <width>3</width>
+        </LineStyle>
+    </Style>
+    
+    <!-- Device Marker Styles -->
+    <Style id="criticalDeviceStyle">
+        <IconStyle>
+            <color>ff0000ff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/target.png</href></Icon>
+            <scale>2.0</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="highDeviceStyle">
+        <IconStyle>
+            <color>ff0080ff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/cross-hairs.png</href></Icon>
+            <scale>1.7</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="mediumDeviceStyle">
+        <IconStyle>
+            <color>ff00ffff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/open-diamond.png</href></Icon>
+            <scale>1.4</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="suspiciousDeviceStyle">
+        <IconStyle>
+            <color>ff0000ff</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/target.png</href></Icon>
+            <scale>1.5</scale>
+        </IconStyle>
+    </Style>
+    
+    <!-- Analysis Styles -->
+    <Style id="heatmapStyle">
+        <PolyStyle>
+            <color>7f0000ff</color>
+            <fill>1</fill>
+            <outline>1</outline>
+        </PolyStyle>
+        <LineStyle>
+            <color>ff0000ff</color>
+            <width>2</width>
+        </LineStyle>
+    </Style>
+    
+    <Style id="temporalPatternStyle">
+        <IconStyle>
+            <color>ff00ff00</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/clock.png</href></Icon>
+            <scale>1.5</scale>
+        </IconStyle>
+    </Style>
+    
+    <Style id="offHoursPatternStyle">
+        <IconStyle>
+            <color>ff800080</color>
+            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/moon.png</href></Icon>
+            <scale>1.5</scale>
+        </IconStyle>
+    </Style>
+    
+    {content}
+</Document>
+</kml>'''
+_KML_PROLOGUE_FMT, _KML_EPILOGUE = _ENHANCED_KML_TEMPLATE.split('{content}')
+
+# Fixed literal segments of the analysis placemarks; the builders below only
+# concatenate the variable fields between them.
+_WORK_HOURS_PARTS = ('''
+    <Placemark>
+        <name>⏰ Work Hours Surveillance Pattern</name>
+        <description>
+            <![CDATA[
+            <h3>👔 WORK HOURS SURVEILLANCE DETECTED</h3>
+            <p><b>''', ''' devices</b> show activity primarily during work hours (9 AM - 5 PM)</p>
+            <p><b>Implications:</b> Possible workplace surveillance or professional monitoring</p>
+            <h4>Affected Devices:</h4>
+            <ul>
+            ''', '''
+            </ul>
+            ]]>
+        </description>
+        <styleUrl>#temporalPatternStyle</styleUrl>
+        <Point>
+            <coordinates>''', '''</coordinates>
+        </Point>
+    </Placemark>''')
+
+_OFF_HOURS_PARTS = ('''
+    <Placemark>
+        <name>🌙 Off-Hours Surveillance Pattern</name>
+        <description>
+            <![CDATA[
+            <h3>🚨 OFF-HOURS SURVEILLANCE DETECTED</h3>
+            <p><b>''', ''' devices</b> show activity primarily during off hours (10 PM - 6 AM)</p>
+            <p><b>Implications:</b> Possible stalking or personal surveillance</p>
+            <h4>Affected Devices:</h4>
+            <ul>
+            ''', '''
+            </ul>
+            ]]>
+        </description>
+        <styleUrl>#offHoursPatternStyle</styleUrl>
+        <Point>
+            <coordinates>''', '''</coordinates>
+        </Point>
+    </Placemark>''')
+
+_HEATMAP_PARTS = ('''
+    <Placemark>
+        <name>🔥 Surveillance Intensity: ''', '''</name>
+        <description>
+            <![CDATA[
+            <h3>📊 SURVEILLANCE INTENSITY ANALYSIS</h3>
+            <table border="1" cellpadding="5">
+            <tr><td><b>Location</b></td><td>''', '''</td></tr>
+            <tr><td><b>Suspicious Devices</b></td><td>''', '''</td></tr>
+            <tr><td><b>Average Persistence Score</b></td><td>''', '''</td></tr>
+            <tr><td><b>Maximum Persistence Score</b></td><td>''', '''</td></tr>
+            <tr><td><b>Intensity Level</b></td><td>''', '''</td></tr>
+            </table>
+            ]]>
+        </description>
+        <styleUrl>#heatmapStyle</styleUrl>
+        <Polygon>
+            <outerBoundaryIs>
+                <LinearRing>
+                    <coordinates>
+                        ''', '''
+                    </coordinates>
+                </LinearRing>
+            </outerBoundaryIs>
+        </Polygon>
+    </Placemark>''')
+
+
+# (cos, sin) of every 10 degrees around the circle: 36 points + close the circle
+_UNIT_CIRCLE = tuple(
+    (math.cos(angle), math.sin(angle))
+    for angle in ((i * 10) * math.pi / 180 for i in range(37))
+)
+
+# Below this many devices the process pool start-up costs more than it saves
+_PARALLEL_CLASSIFY_THRESHOLD = 512
+
+
+def _classify_device_timestamps(timestamps: List[float]) -> Tuple[Optional[str], bool]:
+    """Classify a device's appearance times into a time-of-day bucket
+    ('work', 'off' or None) and whether it appears at regular intervals"""
+    hours = [datetime.fromtimestamp(ts).hour for ts in timestamps]
+    work_hours = [h for h in hours if 9 <= h <= 17]
+    off_hours = [h for h in hours if h >= 22 or h <= 6]
+    
+    work_hour_ratio = len(work_hours) / len(hours) if hours else 0
+    off_hour_ratio = len(off_hours) / len(hours) if hours else 0
+    
+    time_bucket = None
+    if work_hour_ratio > 0.7:
+        time_bucket = 'work'
+    elif off_hour_ratio > 0.7:
+        time_bucket = 'off'
+    
+    # Check for regular intervals
+    is_regular = False
+    if len(timestamps) >= 3:
+        ordered = sorted(timestamps)
+        intervals = [ordered[i] - ordered[i-1] for i in range(1, len(ordered))]
+        if len(intervals) > 1:
+            avg_interval = sum(intervals) / len(intervals)
+            variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
+            is_regular = variance < (avg_interval * 0.1)  # Regular pattern
+    
+    return time_bucket, is_regular
+
+
+def _make_work_hours_placemark(count: int, li_html: str, lon: float, lat: float) -> str:
+    """Build the work hours pattern placemark"""
+    p = _WORK_HOURS_PARTS
+    return p[0] + str(count) + p[1] + li_html + p[2] + f"{lon},{lat},100" + p[3]
+
+
+def _make_off_hours_placemark(count: int, li_html: str, lon: float, lat: float) -> str:
+    """Build the off-hours pattern placemark"""
+    p = _OFF_HOURS_PARTS
+    return p[0] + str(count) + p[1] + li_html + p[2] + f"{lon},{lat},150" + p[3]
+
+
+def _make_heatmap_placemark(location: str, device_count: int, avg_persistence: float,
+                            max_persistence: float, intensity: str, circle_coords: str) -> str:
+    """Build a surveillance intensity heatmap placemark"""
+    p = _HEATMAP_PARTS
+    return "".join((
+        p[0], location, p[1], location, p[2], str(device_count),
+        p[3], f"{avg_persistence:.3f}", p[4], f"{max_persistence:.3f}",
+        p[5], intensity, p[6], circle_coords, p[7]
+    ))
+
 @dataclass
 class GPSLocation:
     """GPS coordinate with metadata"""
@@ -30,6 +317,7 @@ class LocationSession:
     end_time: float
     devices_seen: List[str]  # MAC addresses
     session_id: str
+    seen_macs: Set[str] = field(default_factory=set, repr=False, compare=False)  # Index of devices_seen
 
 class GPSTracker:
     """Track GPS locations and correlate with device appearances"""
@@ -38,6 +326,7 @@ class GPSTracker:
         self.config = config
         self.locations = []
         self.location_sessions = []
+        self._sessions_by_id = {}  # session_id -> sessions with that id, oldest first
         self.current_location = None
         
         # Location clustering settings
@@ -72,8 +361,15 @@ class GPSTracker:
     
     def _get_location_cluster_id(self, location: GPSLocation) -> str:
         """Get cluster ID for location (groups nearby locations)"""
+        # Great-circle distance is never less than the latitude difference
+        # alone, so sessions further apart than that skip the haversine
+        max_delta_lat = math.degrees(self.location_threshold / EARTH_RADIUS_M)
+        latitude = location.latitude
+        
         # Check if this location is close to any existing session
         for session in self.location_sessions:
+            if abs(session.location.latitude - latitude) > max_delta_lat:
+                continue
             distance = self._calculate_distance(location, session.location)
             if distance <= self.location_threshold:
                 return session.session_id
@@ -86,10 +382,9 @@ class GPSTracker:
             base_name = f"loc_{location.latitude:.4f}_{location.longitude:.4f}"
         
         # Make unique
-        existing_ids = [s.session_id for s in self.location_sessions]
         counter = 1
         location_id = base_name
-        while location_id in existing_ids:
+        while location_id in self._sessions_by_id:
             location_id = f"{base_name}_{counter}"
             counter += 1
             
@@ -101,13 +396,12 @@ class GPSTracker:
         
         # Find existing session or create new one
         current_session = None
-        for session in self.location_sessions:
-            if session.session_id == location_id:
-                # Check if this continues the existing session
-                if now - session.end_time <= self.session_timeout:
-                    session.end_time = now
-                    current_session = session
-                    break
+        for session in self._sessions_by_id.get(location_id, ()):
+            # Check if this continues the existing session
+            if now - session.end_time <= self.session_timeout:
+                session.end_time = now
+                current_session = session
+                break
         
         if not current_session:
             # Create new session
@@ -119,6 +413,7 @@ class GPSTracker:
                 session_id=location_id
             )
             self.location_sessions.append(current_session)
+            self._sessions_by_id.setdefault(location_id, []).append(current_session)
         
         self.current_location = current_session
         logger.debug(f"Updated session: {location_id}")
@@ -126,7 +421,7 @@ class GPSTracker:
     def _calculate_distance(self, loc1: GPSLocation, loc2: GPSLocation) -> float:
         """Calculate distance between two GPS locations in meters"""
         # Haversine formula
-        R = 6371000  # Earth's radius in meters
+        R = EARTH_RADIUS_M
         
         lat1_rad = math.radians(loc1.latitude)
         lat2_rad = math.radians(loc2.latitude)
@@ -148,12 +443,34 @@ class GPSTracker:
             logger.warning("No current location - cannot record device")
             return None
         
-        if mac not in self.current_location.devices_seen:
+        if mac not in self.current_location.seen_macs:
+            self.current_location.seen_macs.add(mac)
             self.current_location.devices_seen.append(mac)
             logger.debug(f"Device {mac} seen at {self.current_location.session_id}")
         
         return self.current_location.session_id
     
+    def add_devices_at_current_location(self, macs: Iterable[str]) -> Optional[str]:
+        """Record that several devices were seen at current location, in order"""
+        session = self.current_location
+        if not session:
+            logger.warning("No current location - cannot record devices")
+            return None
+        
+        seen_macs = session.seen_macs
+        devices_seen = session.devices_seen
+        for mac in macs:
+            if mac not in seen_macs:
+                seen_macs.add(mac)
+                devices_seen.append(mac)
+        
+        return session.session_id
+    
+    def get_session(self, session_id: str) -> Optional[LocationSession]:
+        """First location session recorded with this ID"""
+        sessions = self._sessions_by_id.get(session_id)
+        return sessions[0] if sessions else None
+    
     def get_current_location_id(self) -> Optional[str]:
         """Get current location ID"""
         if self.current_location:
@@ -482,18 +799,14 @@ class KMLExporter:
         
         # Generate enhanced final KML with updated styles and timestamp
         full_content = "\n".join(content_parts)
-        enhanced_kml_template = self._get_enhanced_kml_template()
-        kml_output = enhanced_kml_template.format(
-            content=full_content,
+        kml_output = self._write_kml(
+            output_file,
+            full_content,
             timestamp=timestamp,
             total_locations=len(gps_tracker.location_sessions),
             total_devices=len(surveillance_devices) if surveillance_devices else 0
         )
         
-        # Save to file
-        with open(output_file, 'w') as f:
-            f.write(kml_output)
-        
         logger.info(f"🎯 SPECTACULAR KML visualization generated: {output_file}")
         logger.info(f"📊 Includes {len(gps_tracker.location_sessions)} locations, {len(surveillance_devices) if surveillance_devices else 0} surveillance devices")
         return kml_output
@@ -635,7 +948,7 @@ class KMLExporter:
                 
                 # Enhanced markers for each location
                 for session in gps_tracker.location_sessions:
-                    if session.session_id in locations and device.mac in session.devices_seen:
+                    if session.session_id in locations and device.mac in session.seen_macs:
                         # Find device appearances at this location
                         appearances_here = [a for a in device.appearances if a.location_id == session.session_id]
                         
@@ -692,32 +1005,13 @@ class KMLExporter:
                 # Create heatmap circle based on intensity
                 radius = min(max(device_count * 50, 100), 500)  # Scale radius by device count
                 
-                heatmap_circle = f'''
-    <Placemark>
-        <name>🔥 Surveillance Intensity: {location}</name>
-        <description>
-            <![CDATA[
-            <h3>📊 SURVEILLANCE INTENSITY ANALYSIS</h3>
-            <table border="1" cellpadding="5">
-            <tr><td><b>Location</b></td><td>{location}</td></tr>
-            <tr><td><b>Suspicious Devices</b></td><td>{device_count}</td></tr>
-            <tr><td><b>Average Persistence Score</b></td><td>{avg_persistence:.3f}</td></tr>
-            <tr><td><b>Maximum Persistence Score</b></td><td>{max_persistence:.3f}</td></tr>
-            <tr><td><b>Intensity Level</b></td><td>{'🔴 VERY HIGH' if max_persistence > 0.8 else '🟡 ELEVATED' if max_persistence > 0.6 else '🟢 MODERATE'}</td></tr>
-            </table>
-            ]]>
-        </description>
-        <styleUrl>#heatmapStyle</styleUrl>
-        <Polygon>
-            <outerBoundaryIs>
-                <LinearRing>
-                    <coordinates>
-                        {self._generate_circle_coordinates(session.location.longitude, session.location.latitude, radius)}
-                    </coordinates>
-                </LinearRing>
-            </outerBoundaryIs>
-        </Polygon>
-    </Placemark>'''
+                intensity = '🔴 VERY HIGH' if max_persistence > 0.8 else '🟡 ELEVATED' if max_persistence > 0.6 else '🟢 MODERATE'
+                circle_coords = self._generate_circle_coordinates(
+                    session.location.longitude, session.location.latitude, radius
+                )
+                heatmap_circle = _make_heatmap_placemark(
+                    location, device_count, avg_persistence, max_persistence, intensity, circle_coords
+                )
                 content_parts.append(heatmap_circle)
     
     def _add_temporal_analysis_tracks(self, content_parts: List[str], surveillance_devices: List,
@@ -729,241 +1023,73 @@ class KMLExporter:
         off_hour_devices = []
         regular_pattern_devices = []
         
-        for device in surveillance_devices:
-            hours = [datetime.fromtimestamp(a.timestamp).hour for a in device.appearances]
-            work_hours = [h for h in hours if 9 <= h <= 17]
-            off_hours = [h for h in hours if h >= 22 or h <= 6]
-            
-            work_hour_ratio = len(work_hours) / len(hours) if hours else 0
-            off_hour_ratio = len(off_hours) / len(hours) if hours else 0
-            
-            if work_hour_ratio > 0.7:
+        device_timestamps = [[a.timestamp for a in device.appearances] for device in surveillance_devices]
+        if len(device_timestamps) < _PARALLEL_CLASSIFY_THRESHOLD:
+            classifications = map(_classify_device_timestamps, device_timestamps)
+        else:
+            # Each device is classified independently, so large sets are
+            # spread across processes
+            with ProcessPoolExecutor() as executor:
+                classifications = list(executor.map(_classify_device_timestamps, device_timestamps, chunksize=64))
+        
+        for device, (time_bucket, is_regular) in zip(surveillance_devices, classifications):
+            if time_bucket == 'work':
                 work_hour_devices.append(device)
-            elif off_hour_ratio > 0.7:
+            elif time_bucket == 'off':
                 off_hour_devices.append(device)
-            
-            # Check for regular intervals
-            if len(device.appearances) >= 3:
-                timestamps = sorted([a.timestamp for a in device.appearances])
-                intervals = [timestamps[i] - timestamps[i-1] for i in range(1, len(timestamps))]
-                if len(intervals) > 1:
-                    avg_interval = sum(intervals) / len(intervals)
-                    variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
-                    if variance < (avg_interval * 0.1):  # Regular pattern
-                        regular_pattern_devices.append(device)
+            if is_regular:
+                regular_pattern_devices.append(device)
         
         # Create pattern analysis placemarks
+        first_location = gps_tracker.location_sessions[0].location
+        
         if work_hour_devices:
-            analysis = f'''
-    <Placemark>
-        <name>⏰ Work Hours Surveillance Pattern</name>
-        <description>
-            <![CDATA[
-            <h3>👔 WORK HOURS SURVEILLANCE DETECTED</h3>
-            <p><b>{len(work_hour_devices)} devices</b> show activity primarily during work hours (9 AM - 5 PM)</p>
-            <p><b>Implications:</b> Possible workplace surveillance or professional monitoring</p>
-            <h4>Affected Devices:</h4>
-            <ul>
-            {chr(10).join(f'<li>{device.mac} (Score: {device.persistence_score:.2f})</li>' for device in work_hour_devices)}
-            </ul>
-            ]]>
-        </description>
-        <styleUrl>#temporalPatternStyle</styleUrl>
-        <Point>
-            <coordinates>{gps_tracker.location_sessions[0].location.longitude},{gps_tracker.location_sessions[0].location.latitude},100</coordinates>
-        </Point>
-    </Placemark>'''
-            content_parts.append(analysis)
+            device_items = chr(10).join(f'<li>{device.mac} (Score: {device.persistence_score:.2f})</li>' for device in work_hour_devices)
+            content_parts.append(_make_work_hours_placemark(
+                len(work_hour_devices), device_items, first_location.longitude, first_location.latitude
+            ))
         
         if off_hour_devices:
-            analysis = f'''
-    <Placemark>
-        <name>🌙 Off-Hours Surveillance Pattern</name>
-        <description>
-            <![CDATA[
-            <h3>🚨 OFF-HOURS SURVEILLANCE DETECTED</h3>
-            <p><b>{len(off_hour_devices)} devices</b> show activity primarily during off hours (10 PM - 6 AM)</p>
-            <p><b>Implications:</b> Possible stalking or personal surveillance</p>
-            <h4>Affected Devices:</h4>
-            <ul>
-            {chr(10).join(f'<li>{device.mac} (Score: {device.persistence_score:.2f})</li>' for device in off_hour_devices)}
-            </ul>
-            ]]>
-        </description>
-        <styleUrl>#offHoursPatternStyle</styleUrl>
-        <Point>
-            <coordinates>{gps_tracker.location_sessions[0].location.longitude},{gps_tracker.location_sessions[0].location.latitude},150</coordinates>
-        </Point>
-    </Placemark>'''
-            content_parts.append(analysis)
+            device_items = chr(10).join(f'<li>{device.mac} (Score: {device.persistence_score:.2f})</li>' for device in off_hour_devices)
+            content_parts.append(_make_off_hours_placemark(
+                len(off_hour_devices), device_items, first_location.longitude, first_location.latitude
+            ))
     
     def _generate_circle_coordinates(self, center_lon: float, center_lat: float, radius_meters: float) -> str:
         """Generate circle coordinates for KML polygon"""
-        import math
-        
         # Convert radius to degrees (approximate)
         radius_deg = radius_meters / 111000  # rough conversion
         
-        coordinates = []
-        for i in range(37):  # 36 points + close the circle
-            angle = (i * 10) * math.pi / 180  # 10 degrees per point
-            lon = center_lon + radius_deg * math.cos(angle)
-            lat = center_lat + radius_deg * math.sin(angle)
-            coordinates.append(f"{lon},{lat},0")
+        # Fixed 7-decimal precision (~1 cm) with %-formatting, which is cheaper
+        # than generic float __format__ dispatch
+        coordinates = [
+            '%.7f,%.7f,0' % (center_lon + radius_deg * cos_a, center_lat + radius_deg * sin_a)
+            for cos_a, sin_a in _UNIT_CIRCLE
+        ]
         
         return " ".join(coordinates)
     
     def _get_enhanced_kml_template(self) -> str:
         """Get spectacular KML template with advanced styling and metadata"""
-        return '''<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">
-<Document>
-    <name>🛡️ CYT Advanced Surveillance Detection Analysis</name>
-    <description><![CDATA[
-        <h2>📡 CYT Device Analysis Report</h2>
-        <p><b>Generated:</b> {timestamp}</p>
-        <p><b>Analysis:</b> Wireless device tracking and persistence analysis</p>
-        <p><b>GPS Locations:</b> {total_locations} monitoring locations</p>
-        <p><b>Persistent Devices:</b> {total_devices} devices detected</p>
-        <hr>
-        <h3>Visualization Features:</h3>
-        <ul>
-        <li>Color-coded device classifications</li>
-        <li>Location monitoring session data</li>
-        <li>Device movement correlation</li>
-        <li>Activity intensity mapping</li>
-        <li>Time-based pattern analysis</li>
-        </ul>
-        <p><i>KML visualization for Google Earth analysis.</i></p>
-    ]]></description>
-    
-    <!-- Location Styles -->
-    <Style id="locationStyle">
-        <IconStyle>
-            <color>ff00ff00</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/placemark_circle.png</href></Icon>
-            <scale>1.2</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="criticalLocationStyle">
-        <IconStyle>
-            <color>ff0000ff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/forbidden.png</href></Icon>
-            <scale>1.8</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="highThreatLocationStyle">
-        <IconStyle>
-            <color>ff0080ff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/caution.png</href></Icon>
-            <scale>1.5</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="mediumThreatLocationStyle">
-        <IconStyle>
-            <color>ff00ffff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/triangle.png</href></Icon>
-            <scale>1.3</scale>
-        </IconStyle>
-    </Style>
-    
-    <!-- Device Path Styles -->
-    <Style id="criticalDevicePathStyle">
-        <LineStyle>
-            <color>ff0000ff</color>
-            <width>5</width>
-        </LineStyle>
-    </Style>
-    
-    <Style id="highDevicePathStyle">
-        <LineStyle>
-            <color>ff0080ff</color>
-            <width>4</width>
-        </LineStyle>
-    </Style>
-    
-    <Style id="mediumDevicePathStyle">
-        <LineStyle>
-            <color>ff00ffff</color>
-            <width>3</width>
-        </LineStyle>
-    </Style>
-    
-    <Style id="devicePathStyle">
-        <LineStyle>
-            <color>7f00ffff</color>
-            <width>3</width>
-        </LineStyle>
-    </Style>
-    
-    <!-- Device Marker Styles -->
-    <Style id="criticalDeviceStyle">
-        <IconStyle>
-            <color>ff0000ff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/target.png</href></Icon>
-            <scale>2.0</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="highDeviceStyle">
-        <IconStyle>
-            <color>ff0080ff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/cross-hairs.png</href></Icon>
-            <scale>1.7</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="mediumDeviceStyle">
-        <IconStyle>
-            <color>ff00ffff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/open-diamond.png</href></Icon>
-            <scale>1.4</scale>
-        </IconStyle>
-    </Style>
-    
-    <Style id="suspiciousDeviceStyle">
-        <IconStyle>
-            <color>ff0000ff</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/target.png</href></Icon>
-            <scale>1.5</scale>
-        </IconStyle>
-    </Style>
-    
-    <!-- Analysis Styles -->
-    <Style id="heatmapStyle">
-        <PolyStyle>
-            <color>7f0000ff</color>
-            <fill>1</fill>
-            <outline>1</outline>
-        </PolyStyle>
-        <LineStyle>
-            <color>ff0000ff</color>
-            <width>2</width>
-        </LineStyle>
-    </Style>
-    
-    <Style id="temporalPatternStyle">
-        <IconStyle>
-            <color>ff00ff00</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/clock.png</href></Icon>
-            <scale>1.5</scale>
-        </IconStyle>
-    </Style>
+        return _ENHANCED_KML_TEMPLATE
     
-    <Style id="offHoursPatternStyle">
-        <IconStyle>
-            <color>ff800080</color>
-            <Icon><href>http://maps.google.com/mapfiles/kml/shapes/moon.png</href></Icon>
-            <scale>1.5</scale>
-        </IconStyle>
-    </Style>
-    
-    {content}
-</Document>
-</kml>'''
+    def _write_kml(self, output_file: str, content: str, timestamp: str,
+                   total_locations: int, total_devices: int) -> str:
+        """Write KML document around content; only the small prologue is formatted"""
+        prologue = _KML_PROLOGUE_FMT.format(
+            timestamp=timestamp,
+            total_locations=total_locations,
+            total_devices=total_devices
+        )
+        
+        # The document is built once, returned as-is and written in one binary
+        # write as UTF-8 (as declared in the XML header)
+        kml_output = prologue + content + _KML_EPILOGUE
+        
+        with open(output_file, 'wb') as f:
+            f.write(kml_output.encode('utf-8'))
+        
+        return kml_output
     
     def _generate_empty_kml(self, output_file: str) -> str:
         """Generate empty KML when no GPS data is available"""
@@ -985,16 +1111,14 @@ class KMLExporter:
         </Point>
     </Placemark>'''
         
-        kml_output = self._get_enhanced_kml_template().format(
-            content=empty_content,
+        kml_output = self._write_kml(
+            output_file,
+            empty_content,
             timestamp=timestamp,
             total_locations=0,
             total_devices=0
         )
         
-        with open(output_file, 'w') as f:
-            f.write(kml_output)
-        
         logger.warning(f"Empty KML generated: {output_file}")
         return kml_output
 
@@ -2,6 +2,7 @@
 Input validation and sanitization for CYT
 Prevents injection attacks and ensures data integrity
 """
+import os
 import re
 import json
 import logging
@@ -19,6 +20,10 @@ class InputValidator:
     PATH_PATTERN = re.compile(r'^[a-zA-Z0-9._\-/\\:]+$')
     FILENAME_PATTERN = re.compile(r'^[a-zA-Z0-9._\-]+$')
     
+    # Character classes for the fixed-layout MAC check (same rules as MAC_PATTERN)
+    HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+    MAC_SEPARATORS = frozenset(':-')
+    
     # Dangerous characters to filter
     DANGEROUS_CHARS = ['<', '>', '"', "'", '&', ';', '|', '`', '$', '(', ')', '{', '}', '[', ']']
     SQL_KEYWORDS = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP', 'UNION', 'EXEC', 'SCRIPT']
@@ -28,9 +33,13 @@ class InputValidator:
         """Validate MAC address format"""
         if not isinstance(mac, str):
             return False
-        if len(mac) > 17:  # Max length for MAC address
+        if len(mac) != 17:  # XX:XX:XX:XX:XX:XX
             return False
-        return bool(cls.MAC_PATTERN.match(mac))
+        # Separators sit at every third position, hex digit pairs between them;
+        # slicing and set tests do this without running MAC_PATTERN
+        return (cls.MAC_SEPARATORS.issuperset(mac[2::3])
+                and cls.HEX_DIGITS.issuperset(mac[0::3])
+                and cls.HEX_DIGITS.issuperset(mac[1::3]))
     
     @classmethod
     def validate_ssid(cls, ssid: str) -> bool:
@@ -223,14 +232,18 @@ class InputValidator:
         if '*' in db_path:
             # It's a glob pattern - validate the base directory
             base_dir = db_path.split('*')[0]
-            if base_dir and not Path(base_dir).exists():
-                logger.warning(f"Database base directory does not exist: {base_dir}")
-                return False
+            if not base_dir:
+                return True
+            target, missing_msg = base_dir, f"Database base directory does not exist: {base_dir}"
         else:
             # It's a specific file
-            if not Path(db_path).exists():
-                logger.warning(f"Database file does not exist: {db_path}")
-                return False
+            target, missing_msg = db_path, f"Database file does not exist: {db_path}"
+        
+        try:
+            os.stat(target)
+        except OSError:
+            logger.warning(missing_msg)
+            return False
         
         return True
 
@@ -238,8 +251,11 @@ class InputValidator:
 class SecureInputHandler:
     """Wrapper for handling all input validation in CYT"""
     
+    __slots__ = ('validator',)
+    
     def __init__(self):
-        self.validator = InputValidator()
+        # InputValidator only has classmethods, so use the class directly
+        self.validator = InputValidator
     
     def safe_load_config(self, config_path: str) -> Optional[Dict[str, Any]]:
         """Safely load and validate configuration file"""
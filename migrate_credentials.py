@@ -7,7 +7,14 @@ import json
 import sys
 import os
 from pathlib import Path
-from secure_credentials import SecureCredentialManager
+from secure_credentials import SecureCredentialManager, has_inline_credentials
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write data to a temp file and move it into place, so path is never left half-written"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
 def main():
     print("🔐 CYT Credential Migration Tool")
@@ -28,8 +35,7 @@ def main():
         return
     
     api_keys = config['api_keys']
-    if not any('token' in str(value).lower() or 'key' in str(value).lower() 
-              for value in api_keys.values() if isinstance(value, dict)):
+    if not has_inline_credentials(api_keys):
         print("✅ No credentials found to migrate")
         return
     
@@ -47,20 +53,19 @@ def main():
             cred_manager.store_credential('wigle', 'encoded_token', wigle_config['encoded_token'])
             print("✅ WiGLE API token stored securely")
     
-    # Remove API keys from config
-    config_backup = config.copy()
+    # Serialize the original config before removing API keys from it
+    backup_bytes = json.dumps(config, indent=2).encode()
     config.pop('api_keys', None)
+    sanitized_bytes = json.dumps(config, indent=2).encode()
     
     # Create backup of original config
     backup_file = 'config_backup.json'
-    with open(backup_file, 'w') as f:
-        json.dump(config_backup, f, indent=2)
+    _atomic_write(backup_file, backup_bytes)
     print(f"💾 Original config backed up to: {backup_file}")
     
     # Save sanitized config
     sanitized_file = 'config_secure.json'
-    with open(sanitized_file, 'w') as f:
-        json.dump(config, f, indent=2)
+    _atomic_write(sanitized_file, sanitized_bytes)
     print(f"🛡️  Sanitized config saved to: {sanitized_file}")
     
     print("\n🔐 Migration Complete!")
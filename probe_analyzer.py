@@ -1,116 +1,327 @@
 #!/usr/bin/env python3
 
 import json
+import os
+import time
+import hashlib
+import threading
 import pathlib
-import glob
 import re
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import argparse
+from collections import defaultdict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Load config with secure credentials
 from secure_credentials import secure_config_loader
 config, credential_manager = secure_config_loader('config.json')
 
+# Log record prefixes, checked against the start of each raw log line
+PROBE_PREFIX = b'Found a probe!: '
+TIMESTAMP_PREFIX = b'Current Time: '
+
+# Fallback patterns for records that do not start their line
+# [^\n]* scans forward once instead of backtracking like a lazy (.*?)\n
+PROBE_PATTERN = re.compile(rb'Found a probe!: ([^\n]*)')
+TIMESTAMP_PATTERN = re.compile(rb'Current Time: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+
+# Log files are named after the time they were started: cyt_log_MMDDYY_HHMMSS
+LOG_FILENAME_PATTERN = re.compile(r'cyt_log_(\d{2})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})')
+
+# Retries for a rate-limited (HTTP 429) or failed WiGLE request
+WIGLE_MAX_RETRIES = 3
+
+def normalize_ssid(ssid):
+    """Key used to collapse SSIDs that differ only in case or surrounding whitespace"""
+    return ssid.strip().casefold()
+
+def _log_file_start_time(name):
+    """Start time encoded in a cyt_log_MMDDYY_HHMMSS file name, or None"""
+    match = LOG_FILENAME_PATTERN.search(name)
+    if not match:
+        return None
+    month, day, year, hour, minute, second = map(int, match.groups())
+    try:
+        return datetime(2000 + year, month, day, hour, minute, second)
+    except ValueError:
+        return None
+
+def _parse_log_timestamp(raw):
+    """Parse a 'Current Time' value (YYYY-MM-DD HH:MM:SS bytes) into a datetime, or None"""
+    try:
+        return datetime.fromisoformat(raw.decode('ascii'))
+    except ValueError:
+        return None
+
+def _parse_log_file(log_file, verbose=False):
+    """Parse a single CYT log file for probe requests
+    
+    Module-level (and free of ProbeAnalyzer state) so it can run in worker
+    processes. Returns ({ssid: [timestamps]}, {ssid: (count, first_seen, last_seen)},
+    probe_count, probes_found) for the file; probes_found is only filled when verbose.
+    """
+    probes = defaultdict(list)
+    probe_count = 0
+    probes_found = []
+    # Last timestamp seen so far; timestamps are parsed into datetimes once,
+    # here, so later reporting is plain arithmetic
+    timestamp = None
+    # Used for probes logged before the first timestamp
+    file_start_time = _log_file_start_time(os.path.basename(log_file))
+    
+    # Stream the file line by line; CYT writes each record at the start of a
+    # line, so a startswith() test classifies almost every line without
+    # running a regex or holding the whole file in memory
+    with open(log_file, 'rb') as f:
+        for line in f:
+            if line.startswith(PROBE_PREFIX):
+                raw_ssid = line[len(PROBE_PREFIX):]
+            elif line.startswith(TIMESTAMP_PREFIX):
+                timestamp = _parse_log_timestamp(line[len(TIMESTAMP_PREFIX):len(TIMESTAMP_PREFIX) + 19]) or timestamp
+                continue
+            elif PROBE_PREFIX in line or TIMESTAMP_PREFIX in line:
+                # Unusual layout with a record mid-line: fall back to the patterns
+                timestamp_match = TIMESTAMP_PATTERN.search(line)
+                if timestamp_match:
+                    timestamp = _parse_log_timestamp(timestamp_match.group(1)) or timestamp
+                probe_match = PROBE_PATTERN.search(line)
+                if not probe_match:
+                    continue
+                raw_ssid = probe_match.group(1)
+            else:
+                continue
+            
+            probe_count += 1
+            ssid = raw_ssid.decode('utf-8', 'replace').strip()
+            if verbose:
+                probes_found.append(ssid)
+            if timestamp:
+                probes[ssid].append(timestamp)
+            elif file_start_time:
+                # If no timestamp found, use file creation time from filename
+                timestamp = file_start_time
+                probes[ssid].append(timestamp)
+    
+    # Reduce per SSID here, in the worker, so the parent only merges summaries
+    return probes, _summarize_probes(probes), probe_count, probes_found
+
+def _summarize_probes(probes):
+    """Reduce {ssid: [timestamps]} to {ssid: (count, first_seen, last_seen)}"""
+    return {ssid: (len(timestamps), min(timestamps), max(timestamps))
+            for ssid, timestamps in probes.items()}
+
 class ProbeAnalyzer:
-    def __init__(self, log_dir=None, local_only=True, days_back=14):
+    def __init__(self, log_dir=None, local_only=True, days_back=14, verbose=False, rescan=False):
         self.log_dir = log_dir or pathlib.Path(config['paths']['log_dir'])
         self.days_back = days_back
         # Get WiGLE API key from secure storage
         self.wigle_api_key = credential_manager.get_wigle_token()
         if not self.wigle_api_key and not local_only:
             print("⚠️  No WiGLE API token found in secure storage. Use --local for offline analysis.")
-        self.probes = {}  # Dictionary to store probe requests {ssid: [timestamps]}
+        self.probes = defaultdict(list)  # Dictionary to store probe requests {ssid: [timestamps]}
+        self.probe_stats = {}  # Running per-SSID summary {ssid: (count, first_seen, last_seen)}
         self.local_only = local_only  # New flag for local search only
+        self.verbose = verbose  # List every probe while parsing
+        self.rescan = rescan  # Ignore results saved by earlier runs and parse every log again
+        # Persistent WiGLE response cache (opened on first query)
+        self._wigle_cache = None
+        self._wigle_cache_lock = threading.Lock()
+        self.wigle_cache_ttl = config.get('wigle', {}).get('cache_ttl_days', 7) * 86400
+        # Parallel WiGLE requests; keep low to stay within the API rate limit
+        self.wigle_concurrency = max(1, config.get('wigle', {}).get('concurrency', 2))
+        self.session = self._create_wigle_session()
+    
+    def _create_wigle_session(self):
+        """HTTP session that keeps WiGLE connections alive across lookups"""
+        session = requests.Session()
+        if self.wigle_api_key:
+            session.headers.update({'Authorization': f'Basic {self.wigle_api_key}'})
+        # Rate limiting (429) and transient gateway errors are retried with
+        # backoff, honoring Retry-After; the final response is still returned
+        retries = Retry(
+            total=WIGLE_MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=max(20, self.wigle_concurrency),
+            max_retries=retries
+        )
+        session.mount('https://', adapter)
+        return session
         
     def parse_log_file(self, log_file):
         """Parse a single CYT log file for probe requests"""
-        probe_pattern = re.compile(r'Found a probe!: (.*?)\n')
-        # Update timestamp pattern to match log format
-        timestamp_pattern = re.compile(r'Current Time: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
-        
-        with open(log_file, 'r') as f:
-            content = f.read()
-            
+        self._merge_parsed_log(log_file, *_parse_log_file(log_file, self.verbose))
+    
+    def _merge_parsed_log(self, log_file, probes, probe_stats, probe_count, probes_found):
+        """Merge one file's parse result into self.probes and self.probe_stats"""
         # Debug: Print all probes found in this file
-        probes_found = probe_pattern.findall(content)
-        print(f"\nFound {len(probes_found)} probes in {log_file}:")
+        print(f"\nFound {probe_count} probes in {log_file}")
         for probe in probes_found:
             print(f"- {probe}")
         
-        for probe in probe_pattern.finditer(content):
-            ssid = probe.group(1).strip()
-            # Find nearest timestamp before this probe
-            content_before = content[:probe.start()]
-            timestamp_match = timestamp_pattern.findall(content_before)
-            if timestamp_match:
-                timestamp = timestamp_match[-1]  # Get last timestamp before probe
-                if ssid not in self.probes:
-                    self.probes[ssid] = []
-                self.probes[ssid].append(timestamp)
-            else:
-                # If no timestamp found, use file creation time from filename
-                # Format: cyt_log_MMDDYY_HHMMSS
-                filename = str(log_file)
-                date_str = filename.split('_')[2:4]  # ['MMDDYY', 'HHMMSS']
-                if len(date_str) == 2:
-                    timestamp = f"{date_str[0][:2]}-{date_str[0][2:4]}-{date_str[0][4:]} {date_str[1][:2]}:{date_str[1][2:4]}:{date_str[1][4:]}"
-                    if ssid not in self.probes:
-                        self.probes[ssid] = []
-                    self.probes[ssid].append(timestamp)
+        for ssid, timestamps in probes.items():
+            self.probes[ssid].extend(timestamps)
+        
+        for ssid, (count, first_seen, last_seen) in probe_stats.items():
+            merged = self.probe_stats.get(ssid)
+            if merged:
+                count += merged[0]
+                first_seen = min(first_seen, merged[1])
+                last_seen = max(last_seen, merged[2])
+            self.probe_stats[ssid] = (count, first_seen, last_seen)
     
     def parse_all_logs(self):
-        """Parse log files in the log directory (filtered by days_back)"""
+        """Parse log files in the log directory (filtered by days_back)
+        
+        Returns False if the log directory has no CYT log files at all.
+        """
         from datetime import datetime, timedelta
         
         cutoff_date = datetime.now() - timedelta(days=self.days_back)
-        all_log_files = list(self.log_dir.glob('cyt_log_*'))
+        cutoff_ts = cutoff_date.timestamp()
+        try:
+            with os.scandir(self.log_dir) as entries:
+                log_entries = [entry for entry in entries if entry.name.startswith('cyt_log_')]
+        except FileNotFoundError:
+            log_entries = []
+        if not log_entries:
+            return False
+        # stat() is the slow part on SD cards and network mounts, so overlap it
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            file_stats = list(executor.map(lambda entry: entry.stat(), log_entries))
+        all_log_files = [pathlib.Path(entry.path) for entry in log_entries]
+        stats_by_file = dict(zip(all_log_files, file_stats))
         filtered_files = []
         
         print(f"\nFiltering logs to past {self.days_back} days (since {cutoff_date.strftime('%Y-%m-%d')})")
         
-        for log_file in all_log_files:
-            try:
-                # Extract date from filename: cyt_log_MMDDYY_HHMMSS
-                filename_parts = log_file.name.split('_')
-                if len(filename_parts) >= 3:
-                    date_str = filename_parts[2]  # MMDDYY
-                    if len(date_str) == 6:
-                        # Convert MMDDYY to proper date
-                        month = int(date_str[:2])
-                        day = int(date_str[2:4])
-                        year = 2000 + int(date_str[4:6])  # Convert YY to 20YY
-                        
-                        file_date = datetime(year, month, day)
-                        if file_date >= cutoff_date:
-                            filtered_files.append(log_file)
-                        else:
-                            print(f"- Skipping old file: {log_file.name} ({file_date.strftime('%Y-%m-%d')})")
-            except (ValueError, IndexError):
+        for log_file, file_stat in zip(all_log_files, file_stats):
+            mtime = file_stat.st_mtime
+            # A file last written before the cutoff was also created before it,
+            # so there is no need to parse the date out of its name
+            if mtime < cutoff_ts:
+                print(f"- Skipping old file: {log_file.name} ({datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')})")
+                continue
+            file_date = _log_file_start_time(log_file.name)
+            if file_date is None:
                 # If we can't parse the date, include the file to be safe
                 print(f"- Including file with unparseable date: {log_file.name}")
                 filtered_files.append(log_file)
+            elif file_date >= cutoff_date:
+                filtered_files.append(log_file)
+            else:
+                print(f"- Skipping old file: {log_file.name} ({file_date.strftime('%Y-%m-%d')})")
         
         print(f"\nScanning {len(filtered_files)} recent log files (skipped {len(all_log_files) - len(filtered_files)} old files):")
         
+        # Logs parsed by an earlier run and unchanged since (same mtime and
+        # size) are loaded from the state database instead of parsed again
+        state = self._open_parse_state()
         log_count = 0
+        files_to_parse = []
         for log_file in filtered_files:
-            print(f"- Reading {log_file.name}")
-            self.parse_log_file(log_file)
+            saved = self._load_parse_state(state, log_file, stats_by_file[log_file])
+            if saved is None:
+                files_to_parse.append(log_file)
+                continue
+            print(f"- Using saved results for {log_file.name}")
+            self._merge_parsed_log(log_file, *saved)
             log_count += 1
         
+        # Files are independent, so parse them across all cores and merge
+        # the per-file results here in the original order
+        parse = partial(_parse_log_file, verbose=self.verbose)
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count()) if len(files_to_parse) > 1 else None
+        try:
+            results = executor.map(parse, files_to_parse, chunksize=4) if executor else map(parse, files_to_parse)
+            for log_file, parsed in zip(files_to_parse, results):
+                print(f"- Reading {log_file.name}")
+                self._merge_parsed_log(log_file, *parsed)
+                self._save_parse_state(state, log_file, stats_by_file[log_file], parsed)
+                log_count += 1
+        finally:
+            if executor:
+                executor.shutdown()
+            if state:
+                state.close()
+        
         print(f"\nProcessed {log_count} log files from past {self.days_back} days")
+        return True
             
+    def _open_parse_state(self):
+        """Open the incremental parse state database, or None if it is unavailable"""
+        try:
+            state = sqlite3.connect(str(pathlib.Path(self.log_dir) / '.analyzer_state.sqlite'))
+            with state:
+                state.execute(
+                    "CREATE TABLE IF NOT EXISTS files "
+                    "(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, probe_count INTEGER)"
+                )
+                state.execute("CREATE TABLE IF NOT EXISTS probes (path TEXT, ssid TEXT, ts TEXT)")
+                state.execute("CREATE INDEX IF NOT EXISTS idx_probes_path ON probes (path)")
+                if self.rescan:
+                    state.execute("DELETE FROM files")
+                    state.execute("DELETE FROM probes")
+            return state
+        except sqlite3.Error as e:
+            print(f"Parse state unavailable, parsing all logs: {e}")
+            return None
+    
+    def _load_parse_state(self, state, log_file, file_stat):
+        """Return the saved parse result for log_file, or None if missing or the file changed"""
+        if state is None:
+            return None
+        try:
+            row = state.execute(
+                "SELECT probe_count FROM files WHERE path = ? AND mtime = ? AND size = ?",
+                (log_file.name, file_stat.st_mtime, file_stat.st_size)
+            ).fetchone()
+            if row is None:
+                return None
+            probes = defaultdict(list)
+            for ssid, ts in state.execute(
+                "SELECT ssid, ts FROM probes WHERE path = ? ORDER BY rowid", (log_file.name,)
+            ):
+                probes[ssid].append(datetime.fromisoformat(ts))
+        except (sqlite3.Error, ValueError):
+            return None
+        return probes, _summarize_probes(probes), row[0], []
+    
+    def _save_parse_state(self, state, log_file, file_stat, parsed):
+        """Save a file's parse result so unchanged files are skipped next run"""
+        if state is None:
+            return
+        probes, _, probe_count, _ = parsed
+        try:
+            with state:
+                state.execute("DELETE FROM probes WHERE path = ?", (log_file.name,))
+                state.executemany(
+                    "INSERT INTO probes (path, ssid, ts) VALUES (?, ?, ?)",
+                    ((log_file.name, ssid, ts.isoformat(sep=' '))
+                     for ssid, timestamps in probes.items() for ts in timestamps)
+                )
+                state.execute(
+                    "INSERT OR REPLACE INTO files (path, mtime, size, probe_count) VALUES (?, ?, ?, ?)",
+                    (log_file.name, file_stat.st_mtime, file_stat.st_size, probe_count)
+                )
+        except sqlite3.Error as e:
+            print(f"Could not save parse state for {log_file.name}: {e}")
+    
     def query_wigle(self, ssid):
         """Query WiGLE for information about an SSID"""
         if not self.wigle_api_key:
             return {"error": "WiGLE API key not configured"}
             
         print(f"\nQuerying WiGLE for SSID: {ssid}")
-        headers = {
-            'Authorization': f'Basic {self.wigle_api_key}'
-        }
         
         # Only include bounding box if local_only is True and coordinates are set
         params = {'ssid': ssid}
@@ -125,29 +336,91 @@ class ProbeAnalyzer:
                 })
                 print("Using local search area")
         
+        cache_key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        cached = self._get_cached_wigle_response(cache_key)
+        if cached is not None:
+            print("Using cached WiGLE response")
+            return cached
+        
         try:
-            response = requests.get(
+            response = self.session.get(
                 'https://api.wigle.net/api/v2/network/search',
-                headers=headers,
                 params=params
             )
-            return response.json()
+            data = response.json()
         except Exception as e:
             return {"error": str(e)}
+        
+        # Only cache successful lookups so failures are retried next run
+        if response.ok and isinstance(data, dict) and data.get('success', True) and 'error' not in data:
+            self._cache_wigle_response(cache_key, data)
+        return data
+    
+    def _get_wigle_cache(self):
+        """Open (creating if needed) the persistent WiGLE response cache"""
+        if self._wigle_cache is None:
+            # Shared by the query threads; every access holds _wigle_cache_lock
+            self._wigle_cache = sqlite3.connect(
+                str(pathlib.Path(self.log_dir) / 'wigle_cache.sqlite'), check_same_thread=False
+            )
+            self._wigle_cache.execute(
+                "CREATE TABLE IF NOT EXISTS wigle_cache "
+                "(key TEXT PRIMARY KEY, fetched_at INTEGER, payload TEXT)"
+            )
+        return self._wigle_cache
+    
+    def _get_cached_wigle_response(self, cache_key):
+        """Return a cached WiGLE response younger than the cache TTL, or None"""
+        try:
+            min_fetched_at = int(time.time()) - self.wigle_cache_ttl
+            with self._wigle_cache_lock:
+                row = self._get_wigle_cache().execute(
+                    "SELECT payload FROM wigle_cache WHERE key = ? AND fetched_at > ?",
+                    (cache_key, min_fetched_at)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            print(f"WiGLE cache unavailable: {e}")
+            return None
+    
+    def _cache_wigle_response(self, cache_key, data):
+        """Store a WiGLE response in the persistent cache"""
+        try:
+            with self._wigle_cache_lock, self._get_wigle_cache() as cache:
+                cache.execute(
+                    "INSERT OR REPLACE INTO wigle_cache (key, fetched_at, payload) VALUES (?, ?, ?)",
+                    (cache_key, int(time.time()), json.dumps(data))
+                )
+        except sqlite3.Error as e:
+            print(f"Could not cache WiGLE response: {e}")
             
     def analyze_probes(self):
         """Analyze collected probe requests"""
         results = []
-        total_ssids = len(self.probes)
+        total_ssids = len(self.probe_stats)
         print(f"\nQuerying WiGLE for {total_ssids} unique SSIDs...")
-        for i, (ssid, timestamps) in enumerate(self.probes.items(), 1):
-            print(f"\nProgress: {i}/{total_ssids}")
+        
+        # SSIDs differing only in case/whitespace share one lookup, and lookups
+        # are network-bound, so overlap them across a few threads
+        wigle_results = {}
+        if self.wigle_api_key and not self.local_only:
+            lookup_ssids = {}
+            for ssid in self.probe_stats:
+                lookup_ssids.setdefault(normalize_ssid(ssid), ssid)
+            total_lookups = len(lookup_ssids)
+            with ThreadPoolExecutor(max_workers=self.wigle_concurrency) as executor:
+                lookups = zip(lookup_ssids, executor.map(self.query_wigle, lookup_ssids.values()))
+                for i, (key, wigle_data) in enumerate(lookups, 1):
+                    print(f"\nProgress: {i}/{total_lookups}")
+                    wigle_results[key] = wigle_data
+        
+        for ssid, (count, first_seen, last_seen) in self.probe_stats.items():
             result = {
                 "ssid": ssid,
-                "count": len(timestamps),
-                "first_seen": min(timestamps),
-                "last_seen": max(timestamps),
-                "wigle_data": self.query_wigle(ssid) if (self.wigle_api_key and not self.local_only) else None
+                "count": count,
+                "first_seen": first_seen,
+                "last_seen": last_seen,
+                "wigle_data": wigle_results.get(normalize_ssid(ssid))
             }
             results.append(result)
         return results
@@ -166,12 +439,6 @@ def main():
        - Set your search area in config.json under search
     """
     
-    if len(glob.glob(str(pathlib.Path(config['paths']['log_dir']) / 'cyt_log_*'))) == 0:
-        print("\nError: No log files found!")
-        print(f"Please check the logs directory: {config['paths']['log_dir']}")
-        print("Run Chasing Your Tail first to generate some logs.")
-        return
-
     # Check WiGLE configuration
     if not config.get('api_keys', {}).get('wigle'):
         print("\nNote: WiGLE API key not configured.")
@@ -188,6 +455,10 @@ def main():
                       help='Number of days back to analyze (default: 14, use 0 for all logs)')
     parser.add_argument('--all-logs', action='store_true',
                       help='Analyze all log files (equivalent to --days 0)')
+    parser.add_argument('--verbose', action='store_true',
+                      help='List every probe found in each log file')
+    parser.add_argument('--rescan', action='store_true',
+                      help='Re-parse every log instead of reusing results saved by earlier runs')
     args = parser.parse_args()
 
     # Handle days filtering
@@ -201,13 +472,18 @@ def main():
         
     # Default to local_only=True unless --wigle is specified
     use_wigle = args.wigle or args.local  # Keep --local for backwards compatibility
-    analyzer = ProbeAnalyzer(local_only=not use_wigle, days_back=days_back)
+    analyzer = ProbeAnalyzer(local_only=not use_wigle, days_back=days_back,
+                             verbose=args.verbose, rescan=args.rescan)
     
     if use_wigle:
         print("🌐 WiGLE API queries ENABLED - this will consume API credits!")
     else:
         print("🔒 Local analysis only (use --wigle to enable API queries)")
-    analyzer.parse_all_logs()
+    if not analyzer.parse_all_logs():
+        print("\nError: No log files found!")
+        print(f"Please check the logs directory: {analyzer.log_dir}")
+        print("Run Chasing Your Tail first to generate some logs.")
+        return
     results = analyzer.analyze_probes()
     
     if not results:
@@ -229,9 +505,7 @@ def main():
         print(f"Last seen: {result['last_seen']}")
         
         # Calculate time span
-        first = datetime.strptime(result['first_seen'], '%m-%d-%y %H:%M:%S')
-        last = datetime.strptime(result['last_seen'], '%m-%d-%y %H:%M:%S')
-        duration = last - first
+        duration = result['last_seen'] - result['first_seen']
         if duration.total_seconds() > 0:
             print(f"Time span: {duration}")
             print(f"Average frequency: {result['count'] / duration.total_seconds():.2f} probes/second")
@@ -5,6 +5,7 @@ Never store API keys in plain text files!
 import os
 import json
 import base64
+import hashlib
 import logging
 from pathlib import Path
 from typing import Optional, Dict, Any
@@ -15,6 +16,12 @@ from input_validation import InputValidator
 
 logger = logging.getLogger(__name__)
 
+# Length in bytes of the PBKDF2 salt kept in the key file
+SALT_SIZE = 16
+
+# Derived keys by (password digest, salt), shared by every manager in the process
+_derived_key_cache: Dict[tuple, bytes] = {}
+
 class SecureCredentialManager:
     """Secure credential storage and retrieval"""
     
@@ -23,38 +30,50 @@ class SecureCredentialManager:
         self.credentials_dir.mkdir(exist_ok=True, mode=0o700)  # Restrict directory permissions
         self.key_file = self.credentials_dir / ".encryption_key"
         self.credentials_file = self.credentials_dir / "encrypted_credentials.json"
+        self._cipher = None  # Derived Fernet, cached after the first (slow) PBKDF2 run
         
     def _generate_key_from_password(self, password: bytes, salt: bytes) -> bytes:
-        """Generate encryption key from password"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        return base64.urlsafe_b64encode(kdf.derive(password))
+        """Generate encryption key from password, running PBKDF2 once per process"""
+        cache_key = (hashlib.sha256(password).digest(), salt)
+        key = _derived_key_cache.get(cache_key)
+        if key is None:
+            kdf = PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=salt,
+                iterations=100000,
+            )
+            key = base64.urlsafe_b64encode(kdf.derive(password))
+            _derived_key_cache[cache_key] = key
+        return key
     
     def _get_or_create_encryption_key(self) -> Fernet:
         """Get existing encryption key or create new one"""
+        if self._cipher is not None:
+            return self._cipher
+        
         if self.key_file.exists():
-            # Load existing key
-            with open(self.key_file, 'rb') as f:
-                key_data = json.loads(f.read())
-                salt = base64.b64decode(key_data['salt'])
+            # Load existing salt, stored as 16 raw bytes
+            salt = self.key_file.read_bytes()
+            if len(salt) != SALT_SIZE:
+                # Older installs stored {"salt": "<base64>"}; convert in place
+                salt = base64.b64decode(json.loads(salt)['salt'])
+                self._write_salt(salt)
         else:
             # Generate new salt
-            salt = os.urandom(16)
-            key_data = {'salt': base64.b64encode(salt).decode()}
-            
-            # Save salt (not the key itself!)
-            with open(self.key_file, 'wb') as f:
-                f.write(json.dumps(key_data).encode())
-            os.chmod(self.key_file, 0o600)  # Restrict file permissions
+            salt = os.urandom(SALT_SIZE)
+            self._write_salt(salt)
             
         # Get password from environment or prompt
         password = self._get_master_password()
         key = self._generate_key_from_password(password.encode(), salt)
-        return Fernet(key)
+        self._cipher = Fernet(key)
+        return self._cipher
+    
+    def _write_salt(self, salt: bytes) -> None:
+        """Save salt (not the key itself!) as raw bytes"""
+        self.key_file.write_bytes(salt)
+        os.chmod(self.key_file, 0o600)  # Restrict file permissions
     
     def _get_master_password(self) -> str:
         """Get master password from environment variable or prompt user"""
@@ -106,7 +125,7 @@ class SecureCredentialManager:
                     encrypted_data = f.read()
                     if encrypted_data:
                         decrypted_data = cipher.decrypt(encrypted_data)
-                        credentials = json.loads(decrypted_data.decode())
+                        credentials = json.loads(decrypted_data)
             
             # Add new credential
             if service not in credentials:
@@ -114,7 +133,7 @@ class SecureCredentialManager:
             credentials[service][credential_type] = value
             
             # Encrypt and save
-            encrypted_data = cipher.encrypt(json.dumps(credentials).encode())
+            encrypted_data = cipher.encrypt(json.dumps(credentials, separators=(',', ':')).encode())
             with open(self.credentials_file, 'wb') as f:
                 f.write(encrypted_data)
             os.chmod(self.credentials_file, 0o600)  # Restrict file permissions
@@ -122,6 +141,8 @@ class SecureCredentialManager:
             logger.info(f"Stored credential for {service}:{credential_type}")
             
         except Exception as e:
+            # Drop the cached key so a mistyped password can be re-entered
+            self._cipher = None
             logger.error(f"Failed to store credential: {e}")
             raise
     
@@ -140,11 +161,13 @@ class SecureCredentialManager:
                     return None
                 
                 decrypted_data = cipher.decrypt(encrypted_data)
-                credentials = json.loads(decrypted_data.decode())
+                credentials = json.loads(decrypted_data)
             
             return credentials.get(service, {}).get(credential_type)
             
         except Exception as e:
+            # Drop the cached key so a mistyped password can be re-entered
+            self._cipher = None
             logger.error(f"Failed to retrieve credential: {e}")
             return None
     
@@ -170,6 +193,18 @@ class SecureCredentialManager:
         return self.get_credential('wigle', 'encoded_token')
 
 
+# Credential field names contain one of these (e.g. 'encoded_token', 'api_key')
+_CREDENTIAL_MARKERS = ('token', 'key')
+
+
+def has_inline_credentials(api_keys: Dict[str, Any]) -> bool:
+    """Check the api_keys config section for credential fields by name"""
+    return any(marker in field.lower()
+               for service in api_keys.values() if isinstance(service, dict)
+               for field in service
+               for marker in _CREDENTIAL_MARKERS)
+
+
 def secure_config_loader(config_path: str = 'config.json') -> Dict[str, Any]:
     """
     Load configuration with secure credential handling
@@ -186,8 +221,7 @@ def secure_config_loader(config_path: str = 'config.json') -> Dict[str, Any]:
         api_keys = config['api_keys']
         
         # Check for insecure API keys in config
-        if any('token' in str(api_keys).lower() or 'key' in str(api_keys).lower() 
-               for key in api_keys.values() if isinstance(key, dict)):
+        if has_inline_credentials(api_keys):
             
             logger.warning("Found API keys in config file - initiating secure migration")
             cred_manager.migrate_from_config(config)
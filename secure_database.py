@@ -4,18 +4,92 @@ Secure database operations - prevents SQL injection
 import sqlite3
 import json
 import logging
-from typing import List, Tuple, Optional, Dict, Any
-from datetime import datetime, timedelta
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Set, Sequence, Tuple, Optional, Dict, Any
 import time
 
 logger = logging.getLogger(__name__)
 
+# Per-connection tuning for the repeated read-only polling of the Kismet DB
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # Map up to 256 MB instead of read() per page
+)
+
+# JSON path to the SSID of a device's last probe request in Kismet's device blob
+PROBED_SSID_PATH = '$."dot11.device"."dot11.device.last_probed_ssid_record"."dot11.probedssid.ssid"'
+
+# MACs and probed SSIDs for several windows in one scan. 'tracked' says
+# whether the MAC belongs in the MAC lists, and {window_flags} becomes one
+# "in window i" column per window at the end of each row.
+_ACTIVITY_WINDOWS_TEMPLATE = (
+    "SELECT UPPER(devmac) AS mac, {tracked} AS tracked, CASE WHEN json_valid(device_json) THEN "
+    f"CASE WHEN json_type(device_json, '{PROBED_SSID_PATH}') = 'text' "
+    f"THEN json_extract(device_json, '{PROBED_SSID_PATH}') END END AS ssid{{window_flags}} "
+    "FROM (SELECT devmac, last_time, CAST(device AS TEXT) AS device_json "
+    "FROM devices WHERE last_time >= ?)"
+)
+ACTIVITY_WINDOWS_QUERY = _ACTIVITY_WINDOWS_TEMPLATE.replace("{tracked}", "devmac != ''")
+UNIGNORED_ACTIVITY_WINDOWS_QUERY = _ACTIVITY_WINDOWS_TEMPLATE.replace(
+    "{tracked}", "devmac != '' AND UPPER(devmac) NOT IN (SELECT mac FROM ignore_macs)"
+)
+
+# Rows fetched per round trip when streaming query results
+FETCH_BATCH_SIZE = 1000
+
+# Prepared statements kept per connection (sqlite3's default is 128)
+STATEMENT_CACHE_SIZE = 128
+
+def _time_range_queries(template: str) -> Tuple[str, str]:
+    """Build the (since start, between start and end) variants of a query once"""
+    return (template.format(time_filter="last_time >= ?"),
+            template.format(time_filter="last_time >= ? AND last_time <= ?"))
+
+# The polling loop issues the same few queries every cycle, so they are built
+# once here and the identical SQL text hits the connection's statement cache
+DEVICE_QUERIES = _time_range_queries(
+    "SELECT devmac, type, device, last_time FROM devices WHERE {time_filter}"
+)
+MAC_QUERIES = _time_range_queries(
+    "SELECT UPPER(devmac) AS mac FROM devices WHERE {time_filter} AND devmac != ''"
+)
+UNIGNORED_MAC_QUERIES = _time_range_queries(
+    "SELECT UPPER(devmac) AS mac FROM devices WHERE {time_filter} AND devmac != '' "
+    "AND UPPER(devmac) NOT IN (SELECT mac FROM ignore_macs)"
+)
+# SQLite's JSON1 functions pull out just the SSID, so the device blob is never
+# parsed in Python. json_valid() guards the other JSON calls, which fail the
+# whole query on a malformed blob.
+PROBE_QUERIES = _time_range_queries(
+    f"SELECT devmac, last_time, json_extract(device_json, '{PROBED_SSID_PATH}') AS ssid "
+    "FROM (SELECT devmac, last_time, CAST(device AS TEXT) AS device_json "
+    "FROM devices WHERE {time_filter}) "
+    "WHERE CASE WHEN json_valid(device_json) "
+    f"THEN json_type(device_json, '{PROBED_SSID_PATH}') = 'text' END "
+    "AND ssid != ''"
+)
+# Every device with its probed SSID, NULL when it has none
+DEVICE_PROBE_QUERIES = _time_range_queries(
+    "SELECT UPPER(devmac) AS mac, last_time, CASE WHEN json_valid(device_json) THEN "
+    f"CASE WHEN json_type(device_json, '{PROBED_SSID_PATH}') = 'text' "
+    f"THEN json_extract(device_json, '{PROBED_SSID_PATH}') END END AS ssid "
+    "FROM (SELECT devmac, last_time, CAST(device AS TEXT) AS device_json "
+    "FROM devices WHERE {time_filter})"
+)
+
 class SecureKismetDB:
     """Secure wrapper for Kismet database operations"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, read_only: bool = False):
         self.db_path = db_path
+        self.read_only = read_only  # Open with mode=ro; usable from any thread
         self._connection = None
+        self._ignoring_macs = False  # ignore_macs temp table loaded on this connection
     
     def __enter__(self):
         self.connect()
@@ -27,18 +101,33 @@ class SecureKismetDB:
     def connect(self) -> None:
         """Establish secure database connection"""
         try:
-            self._connection = sqlite3.connect(self.db_path, timeout=30.0)
+            # Autocommit: every query is a read, so no implicit transactions are needed
+            if self.read_only:
+                self._connection = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro",
+                                                   uri=True, timeout=30.0, isolation_level=None,
+                                                   cached_statements=STATEMENT_CACHE_SIZE,
+                                                   check_same_thread=False)
+            else:
+                self._connection = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None,
+                                                   cached_statements=STATEMENT_CACHE_SIZE)
             self._connection.row_factory = sqlite3.Row  # Enable column access by name
+            self._apply_pragmas()
             logger.info(f"Connected to database: {self.db_path}")
         except sqlite3.Error as e:
             logger.error(f"Failed to connect to database {self.db_path}: {e}")
             raise
     
+    def _apply_pragmas(self) -> None:
+        """Tune the connection for read-heavy polling; the journal mode is Kismet's to choose"""
+        for pragma in CONNECTION_PRAGMAS:
+            self._connection.execute(pragma)
+    
     def close(self) -> None:
         """Close database connection"""
         if self._connection:
             self._connection.close()
             self._connection = None
+            self._ignoring_macs = False
     
     def execute_safe_query(self, query: str, params: Tuple = ()) -> List[sqlite3.Row]:
         """Execute parameterized query safely"""
@@ -53,7 +142,38 @@ class SecureKismetDB:
             logger.error(f"Database query failed: {query}, params: {params}, error: {e}")
             raise
     
-    def get_devices_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> List[Dict[str, Any]]:
+    def iter_safe_query(self, query: str, params: Tuple = (), plain_rows: bool = False) -> Iterator[sqlite3.Row]:
+        """
+        Execute parameterized query safely, yielding rows in batches instead of fetching all
+        plain_rows yields tuples instead of sqlite3.Row, for hot loops that unpack by position
+        """
+        if not self._connection:
+            raise RuntimeError("Database not connected")
+        
+        try:
+            cursor = self._connection.cursor()
+            if plain_rows:
+                cursor.row_factory = None
+            cursor.arraysize = FETCH_BATCH_SIZE
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield from rows
+        except sqlite3.Error as e:
+            logger.error(f"Database query failed: {query}, params: {params}, error: {e}")
+            raise
+    
+    @staticmethod
+    def _time_range_query(queries: Tuple[str, str], start_time: float,
+                          end_time: Optional[float]) -> Tuple[str, Tuple]:
+        """Pick the query variant and parameters for an optional end time"""
+        if end_time is not None:
+            return queries[1], (start_time, end_time)
+        return queries[0], (start_time,)
+    
+    def get_devices_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> Iterator[Dict[str, Any]]:
         """
         Get devices within time range with proper parameterization
         
@@ -61,20 +181,12 @@ class SecureKismetDB:
             start_time: Unix timestamp for start time
             end_time: Optional unix timestamp for end time
             
-        Returns:
-            List of device dictionaries
+        Yields:
+            Device dictionaries, parsed one row at a time
         """
-        if end_time is not None:
-            query = "SELECT devmac, type, device, last_time FROM devices WHERE last_time >= ? AND last_time <= ?"
-            params = (start_time, end_time)
-        else:
-            query = "SELECT devmac, type, device, last_time FROM devices WHERE last_time >= ?"
-            params = (start_time,)
-        
-        rows = self.execute_safe_query(query, params)
+        query, params = self._time_range_query(DEVICE_QUERIES, start_time, end_time)
         
-        devices = []
-        for row in rows:
+        for row in self.iter_safe_query(query, params):
             try:
                 # Parse device JSON safely
                 device_data = None
@@ -84,62 +196,122 @@ class SecureKismetDB:
                     except (json.JSONDecodeError, TypeError) as e:
                         logger.warning(f"Failed to parse device JSON for {row['devmac']}: {e}")
                 
-                devices.append({
+                device = {
                     'mac': row['devmac'],
                     'type': row['type'],
                     'device_data': device_data,
                     'last_time': row['last_time']
-                })
+                }
             except Exception as e:
                 logger.warning(f"Error processing device row: {e}")
                 continue
+            yield device
+    
+    def set_ignored_macs(self, macs: Iterable[str]) -> None:
+        """Load an ignore list into a temp table so MAC queries can exclude it in SQL"""
+        if not self._connection:
+            raise RuntimeError("Database not connected")
         
-        return devices
+        try:
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS ignore_macs (mac TEXT PRIMARY KEY)")
+            self._connection.execute("DELETE FROM ignore_macs")
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO ignore_macs (mac) VALUES (?)",
+                ((mac.upper(),) for mac in macs)
+            )
+            self._ignoring_macs = True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load MAC ignore list: {e}")
+            raise
     
     def get_mac_addresses_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> List[str]:
-        """Get just MAC addresses for a time range"""
-        devices = self.get_devices_by_time_range(start_time, end_time)
-        return [device['mac'] for device in devices if device['mac']]
+        """
+        Get just MAC addresses for a time range, minus any loaded with set_ignored_macs()
+        MACs are upper-cased by SQLite, matching the normalized ignore list
+        """
+        queries = UNIGNORED_MAC_QUERIES if self._ignoring_macs else MAC_QUERIES
+        query, params = self._time_range_query(queries, start_time, end_time)
+        
+        return [row['mac'] for row in self.iter_safe_query(query, params)]
     
-    def get_probe_requests_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> List[Dict[str, str]]:
+    def get_activity_by_time_windows(self, windows: Sequence[Tuple[float, Optional[float]]]
+                                     ) -> Tuple[List[Set[str]], List[Set[str]]]:
         """
-        Get probe requests with SSIDs for time range
+        Get MAC addresses and probed SSIDs for several (start_time, end_time)
+        windows from a single scan that both lists share
         
         Returns:
-            List of dicts with 'mac', 'ssid', 'timestamp'
+            (macs, ssids), each with one set per window. MACs are upper-cased,
+            minus any loaded with set_ignored_macs(); empty SSIDs are dropped
         """
-        devices = self.get_devices_by_time_range(start_time, end_time)
+        window_flags = ''.join(
+            ", last_time >= ? AND last_time <= ?" if end_time is not None else ", last_time >= ?"
+            for _, end_time in windows
+        )
+        params = [value for start_time, end_time in windows
+                  for value in ((start_time,) if end_time is None else (start_time, end_time))]
+        params.append(min(start_time for start_time, _ in windows))
+        template = UNIGNORED_ACTIVITY_WINDOWS_QUERY if self._ignoring_macs else ACTIVITY_WINDOWS_QUERY
         
-        probes = []
-        for device in devices:
-            mac = device['mac']
-            device_data = device['device_data']
-            
-            if not device_data:
-                continue
-            
-            # Extract probe request SSID safely
-            try:
-                dot11_device = device_data.get('dot11.device', {})
-                if not isinstance(dot11_device, dict):
-                    continue
-                    
-                probe_record = dot11_device.get('dot11.device.last_probed_ssid_record', {})
-                if not isinstance(probe_record, dict):
-                    continue
-                
-                ssid = probe_record.get('dot11.probedssid.ssid', '')
-                if ssid and isinstance(ssid, str):
-                    probes.append({
-                        'mac': mac,
-                        'ssid': ssid,
-                        'timestamp': device['last_time']
-                    })
-            except (KeyError, TypeError, AttributeError) as e:
-                logger.debug(f"No probe data for device {mac}: {e}")
-                continue
+        rows = self.iter_safe_query(template.format(window_flags=window_flags), tuple(params), plain_rows=True)
+        
+        # This loop runs once per device per cycle, so it sticks to tuple
+        # unpacking and adds straight into the per-window sets
+        if len(windows) == 1:
+            macs, ssids = set(), set()
+            add_mac, add_ssid = macs.add, ssids.add
+            for mac, tracked, ssid, _ in rows:
+                if tracked:
+                    add_mac(mac)
+                if ssid:
+                    add_ssid(ssid)
+            return [macs], [ssids]
+        
+        # A row on a shared boundary lands in both windows, as with separate queries
+        macs = [set() for _ in windows]
+        ssids = [set() for _ in windows]
+        mac_adders = [window.add for window in macs]
+        ssid_adders = [window.add for window in ssids]
+        for mac, tracked, ssid, *in_windows in rows:
+            for add_mac, add_ssid, in_window in zip(mac_adders, ssid_adders, in_windows):
+                if in_window:
+                    if tracked:
+                        add_mac(mac)
+                    if ssid:
+                        add_ssid(ssid)
+        return macs, ssids
+    
+    def get_probe_requests_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> Iterator[Dict[str, str]]:
+        """
+        Get probe requests with SSIDs for time range
+        
+        Yields:
+            Dicts with 'mac', 'ssid', 'timestamp'
+        """
+        query, params = self._time_range_query(PROBE_QUERIES, start_time, end_time)
         
-        return probes
+        for row in self.iter_safe_query(query, params):
+            yield {
+                'mac': row['devmac'],
+                'ssid': row['ssid'],
+                'timestamp': row['last_time']
+            }
+    
+    def get_device_probes_by_time_range(self, start_time: float, end_time: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Get every device in a time range with its last probed SSID
+        
+        Yields:
+            Dicts with 'mac' (upper-cased), 'ssid' (None if the device has not probed), 'timestamp'
+        """
+        query, params = self._time_range_query(DEVICE_PROBE_QUERIES, start_time, end_time)
+        
+        for row in self.iter_safe_query(query, params):
+            yield {
+                'mac': row['mac'],
+                'ssid': row['ssid'],
+                'timestamp': row['last_time']
+            }
     
     def validate_connection(self) -> bool:
         """Validate database connection and basic structure"""
@@ -154,6 +326,43 @@ class SecureKismetDB:
             return False
 
 
+class SecureKismetDBPool:
+    """Fixed-size pool of read-only SecureKismetDB connections for concurrent readers"""
+    
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self._pool: "queue.Queue[SecureKismetDB]" = queue.Queue(maxsize=size)
+        self._connections: List[SecureKismetDB] = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            db = SecureKismetDB(db_path, read_only=True)
+            db.connect()
+            self._connections.append(db)
+            self._pool.put(db)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    @contextmanager
+    def connection(self) -> Iterator[SecureKismetDB]:
+        """Borrow a connection, blocking until one is free"""
+        db = self._pool.get()
+        try:
+            yield db
+        finally:
+            self._pool.put(db)
+    
+    def close(self) -> None:
+        """Close every pooled connection"""
+        with self._lock:
+            for db in self._connections:
+                db.close()
+            self._connections.clear()
+
+
 class SecureTimeWindows:
     """Secure time window management for device tracking"""
     
@@ -168,16 +377,14 @@ class SecureTimeWindows:
     
     def get_time_boundaries(self) -> Dict[str, float]:
         """Calculate secure time boundaries"""
-        now = datetime.now()
+        # Whole seconds, like Kismet's last_time column
+        now = float(int(time.time()))
         
-        boundaries = {}
-        for window_name, minutes in self.time_windows.items():
-            boundary_time = now - timedelta(minutes=minutes)
-            boundaries[f'{window_name}_time'] = time.mktime(boundary_time.timetuple())
+        boundaries = {f'{window_name}_time': now - minutes * 60
+                      for window_name, minutes in self.time_windows.items()}
         
         # Add current time boundary (2 minutes ago for active scanning)
-        current_boundary = now - timedelta(minutes=2)
-        boundaries['current_time'] = time.mktime(current_boundary.timetuple())
+        boundaries['current_time'] = now - 120
         
         return boundaries
     
@@ -213,4 +420,9 @@ class SecureTimeWindows:
 
 def create_secure_db_connection(db_path: str) -> SecureKismetDB:
     """Factory function to create secure database connection"""
-    return SecureKismetDB(db_path)
\ No newline at end of file
+    return SecureKismetDB(db_path)
+
+
+def create_secure_db_pool(db_path: str, size: int = 4) -> SecureKismetDBPool:
+    """Factory function to create a pool of read-only database connections"""
+    return SecureKismetDBPool(db_path, size)
\ No newline at end of file
@@ -1,6 +1,8 @@
 """
 Secure ignore list loader - replaces dangerous exec() calls
 """
+import ast
+import functools
 import json
 import pathlib
 import re
@@ -10,18 +12,69 @@ from input_validation import InputValidator
 
 logger = logging.getLogger(__name__)
 
+# Ignore lists and probe feeds repeat the same strings, so remember the verdicts
+_cached_validate_mac = functools.lru_cache(maxsize=4096)(InputValidator.validate_mac_address)
+_cached_validate_ssid = functools.lru_cache(maxsize=4096)(InputValidator.validate_ssid)
+
+@functools.lru_cache(maxsize=8)
+def _assignment_pattern(variable_name: str) -> re.Pattern:
+    """Compiled pattern for `variable_name = [...]`, built once per name"""
+    return re.compile(rf'{re.escape(variable_name)}\s*=\s*(\[.*?\])', re.DOTALL)
+
+
+class SSIDIgnoreList:
+    """
+    SSID ignore list supporting exact entries and 'Prefix*' wildcard entries
+    Prefixes live in a character trie, so a lookup costs one step per SSID
+    character no matter how many prefix entries there are
+    """
+    
+    _END = ''  # Trie key marking the end of a prefix entry
+    
+    def __init__(self, ssids: List[str]):
+        exact = set()
+        self._prefixes = {}
+        for ssid in ssids:
+            if ssid.endswith('*'):
+                node = self._prefixes
+                for char in ssid[:-1]:
+                    node = node.setdefault(char, {})
+                node[self._END] = True
+            else:
+                exact.add(ssid)
+        self.exact = frozenset(exact)
+    
+    def __contains__(self, ssid: str) -> bool:
+        if ssid in self.exact:
+            return True
+        node = self._prefixes
+        if not node:
+            return False
+        for char in ssid:
+            if self._END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self._END in node
+
+
 class SecureIgnoreLoader:
     """Secure loader for MAC and SSID ignore lists"""
     
     @staticmethod
     def validate_mac_address(mac: str) -> bool:
         """Validate MAC address format using secure validator"""
-        return InputValidator.validate_mac_address(mac)
+        if not isinstance(mac, str):
+            return False
+        return _cached_validate_mac(mac)
     
     @staticmethod
     def validate_ssid(ssid: str) -> bool:
         """Validate SSID using secure validator"""
-        return InputValidator.validate_ssid(ssid)
+        if not isinstance(ssid, str):
+            return False
+        return _cached_validate_ssid(ssid)
     
     @classmethod
     def load_mac_list(cls, file_path: pathlib.Path) -> List[str]:
@@ -118,21 +171,22 @@ class SecureIgnoreLoader:
         content_clean = ' '.join(lines)
         
         # Look for variable assignment pattern
-        pattern = rf'{re.escape(variable_name)}\s*=\s*(\[.*?\])'
-        match = re.search(pattern, content_clean, re.DOTALL)
+        match = _assignment_pattern(variable_name).search(content_clean)
         
         if not match:
             raise ValueError(f"Could not find {variable_name} assignment")
         
         list_str = match.group(1)
         
-        # Use json.loads for safe parsing (requires proper JSON format)
+        # literal_eval only accepts literals, so this is safe without exec() and
+        # handles either quote style, including apostrophes inside SSIDs
         try:
-            # Replace single quotes with double quotes for JSON compatibility
-            json_str = list_str.replace("'", '"')
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Could not parse list as JSON: {e}")
+            parsed = ast.literal_eval(list_str)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"Could not parse list literal: {e}")
+        if not isinstance(parsed, list):
+            raise ValueError(f"{variable_name} is not a list")
+        return parsed
     
     @classmethod
     def save_mac_list(cls, mac_list: List[str], file_path: pathlib.Path) -> None:
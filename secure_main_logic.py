@@ -2,262 +2,201 @@
 Secure main logic for Chasing Your Tail - replaces vulnerable SQL operations
 """
 import logging
-from typing import List, Dict, Set
+import sys
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Dict, Optional, Set, Tuple
 from secure_database import SecureKismetDB, SecureTimeWindows
+from secure_ignore_loader import SSIDIgnoreList
 
 logger = logging.getLogger(__name__)
 
+# Tracking windows, newest first: past 5, 5-10, 10-15 and 15-20 minutes ago
+WINDOW_PERIODS = ("Past 5 minutes", "5-10 minutes ago", "10-15 minutes ago", "15-20 minutes ago")
+# (list name, window span) for the older windows checked for repeat sightings
+HISTORY_LABELS = (("5 to 10 mins", "5-10"), ("10 to 15 mins", "10-15"), ("15 to 20 mins", "15-20"))
+
 class SecureCYTMonitor:
     """Secure monitoring logic for CYT"""
     
     def __init__(self, config: dict, ignore_list: List[str], ssid_ignore_list: List[str], log_file):
         self.config = config
-        self.ignore_list = set(mac.upper() for mac in ignore_list)  # Convert to set for O(1) lookup
-        self.ssid_ignore_list = set(ssid_ignore_list)
+        self.ignore_list = frozenset(mac.upper() for mac in ignore_list)  # Fixed for the monitor's lifetime
+        self.ssid_ignore_list = SSIDIgnoreList(ssid_ignore_list)  # Exact and 'Prefix*' entries
         self.log_file = log_file
+        # Output is queued per cycle and written with one call per stream
+        self._log_lines: List[str] = []
+        self._console_lines: List[str] = []
         self.time_manager = SecureTimeWindows(config)
         
-        # Initialize tracking lists
-        self.past_five_mins_macs: Set[str] = set()
-        self.five_ten_min_ago_macs: Set[str] = set()
-        self.ten_fifteen_min_ago_macs: Set[str] = set()
-        self.fifteen_twenty_min_ago_macs: Set[str] = set()
-        
-        self.past_five_mins_ssids: Set[str] = set()
-        self.five_ten_min_ago_ssids: Set[str] = set()
-        self.ten_fifteen_min_ago_ssids: Set[str] = set()
-        self.fifteen_twenty_min_ago_ssids: Set[str] = set()
+        # Initialize tracking lists: ring buffers of sets, newest window first,
+        # so rotation is a single appendleft() that drops the oldest window
+        self.mac_windows: Deque[Set[str]] = self._new_windows()
+        self.ssid_windows: Deque[Set[str]] = self._new_windows()
+    
+    @staticmethod
+    def _new_windows(sets=None) -> Deque[Set[str]]:
+        """Ring buffer of per-window sets, empty unless sets are given"""
+        if sets is None:
+            sets = (set() for _ in WINDOW_PERIODS)
+        return deque(sets, maxlen=len(WINDOW_PERIODS))
     
     def initialize_tracking_lists(self, db: SecureKismetDB) -> None:
         """Initialize all tracking lists securely"""
         try:
             boundaries = self.time_manager.get_time_boundaries()
             
-            # Initialize MAC tracking lists
-            self._initialize_mac_lists(db, boundaries)
-            
-            # Initialize SSID tracking lists  
-            self._initialize_ssid_lists(db, boundaries)
+            # Initialize MAC and SSID tracking lists
+            self._initialize_windows(db, boundaries)
             
             self._log_initialization_stats()
             
         except Exception as e:
             logger.error(f"Failed to initialize tracking lists: {e}")
             raise
+        finally:
+            self._flush_output()
     
-    def _initialize_mac_lists(self, db: SecureKismetDB, boundaries: Dict[str, float]) -> None:
-        """Initialize MAC address tracking lists"""
-        # Past 5 minutes
-        macs = db.get_mac_addresses_by_time_range(boundaries['recent_time'])
-        self.past_five_mins_macs = self._filter_macs(macs)
-        
-        # 5-10 minutes ago
-        macs = db.get_mac_addresses_by_time_range(boundaries['medium_time'], boundaries['recent_time'])
-        self.five_ten_min_ago_macs = self._filter_macs(macs)
-        
-        # 10-15 minutes ago
-        macs = db.get_mac_addresses_by_time_range(boundaries['old_time'], boundaries['medium_time'])
-        self.ten_fifteen_min_ago_macs = self._filter_macs(macs)
-        
-        # 15-20 minutes ago
-        macs = db.get_mac_addresses_by_time_range(boundaries['oldest_time'], boundaries['old_time'])
-        self.fifteen_twenty_min_ago_macs = self._filter_macs(macs)
+    @staticmethod
+    def _tracking_windows(boundaries: Dict[str, float]) -> List[Tuple[float, Optional[float]]]:
+        """(start, end) of the past 5, 5-10, 10-15 and 15-20 minute windows"""
+        return [
+            (boundaries['recent_time'], None),
+            (boundaries['medium_time'], boundaries['recent_time']),
+            (boundaries['old_time'], boundaries['medium_time']),
+            (boundaries['oldest_time'], boundaries['old_time'])
+        ]
     
-    def _initialize_ssid_lists(self, db: SecureKismetDB, boundaries: Dict[str, float]) -> None:
-        """Initialize SSID tracking lists"""
-        # Past 5 minutes
-        probes = db.get_probe_requests_by_time_range(boundaries['recent_time'])
-        self.past_five_mins_ssids = self._filter_ssids([p['ssid'] for p in probes])
-        
-        # 5-10 minutes ago
-        probes = db.get_probe_requests_by_time_range(boundaries['medium_time'], boundaries['recent_time'])
-        self.five_ten_min_ago_ssids = self._filter_ssids([p['ssid'] for p in probes])
-        
-        # 10-15 minutes ago
-        probes = db.get_probe_requests_by_time_range(boundaries['old_time'], boundaries['medium_time'])
-        self.ten_fifteen_min_ago_ssids = self._filter_ssids([p['ssid'] for p in probes])
-        
-        # 15-20 minutes ago
-        probes = db.get_probe_requests_by_time_range(boundaries['oldest_time'], boundaries['old_time'])
-        self.fifteen_twenty_min_ago_ssids = self._filter_ssids([p['ssid'] for p in probes])
+    def _initialize_windows(self, db: SecureKismetDB, boundaries: Dict[str, float]) -> None:
+        """Initialize MAC address and SSID tracking lists"""
+        db.set_ignored_macs(self.ignore_list)
+        
+        # All four windows of both kinds come back from a single scan
+        macs, ssids = db.get_activity_by_time_windows(self._tracking_windows(boundaries))
+        self.mac_windows = self._new_windows(macs)
+        self.ssid_windows = self._new_windows(self._filter_ssids(window) for window in ssids)
+    
+    def _filter_ssids(self, ssids: Set[str]) -> Set[str]:
+        """Drop ignored SSIDs; the query already dedupes them and drops empty ones"""
+        return {ssid for ssid in ssids if ssid not in self.ssid_ignore_list}
     
-    def _filter_macs(self, mac_list: List[str]) -> Set[str]:
-        """Filter MAC addresses against ignore list"""
-        return {mac.upper() for mac in mac_list if mac.upper() not in self.ignore_list}
+    def _emit(self, message: str, console: bool = True, log: bool = True) -> None:
+        """Queue a message for the console and/or log file until the next flush"""
+        if console:
+            self._console_lines.append(message)
+        if log:
+            self._log_lines.append(message)
     
-    def _filter_ssids(self, ssid_list: List[str]) -> Set[str]:
-        """Filter SSIDs against ignore list"""
-        return {ssid for ssid in ssid_list if ssid and ssid not in self.ssid_ignore_list}
+    def _flush_output(self) -> None:
+        """Write all queued messages, one write per stream"""
+        if self._console_lines:
+            sys.stdout.write('\n'.join(self._console_lines) + '\n')
+            sys.stdout.flush()
+            self._console_lines.clear()
+        if self._log_lines:
+            self.log_file.write('\n'.join(self._log_lines) + '\n')
+            self._log_lines.clear()
     
     def _log_initialization_stats(self) -> None:
         """Log initialization statistics"""
-        mac_stats = [
-            ("Past 5 minutes", len(self.past_five_mins_macs)),
-            ("5-10 minutes ago", len(self.five_ten_min_ago_macs)),
-            ("10-15 minutes ago", len(self.ten_fifteen_min_ago_macs)),
-            ("15-20 minutes ago", len(self.fifteen_twenty_min_ago_macs))
-        ]
-        
-        ssid_stats = [
-            ("Past 5 minutes", len(self.past_five_mins_ssids)),
-            ("5-10 minutes ago", len(self.five_ten_min_ago_ssids)),
-            ("10-15 minutes ago", len(self.ten_fifteen_min_ago_ssids)),
-            ("15-20 minutes ago", len(self.fifteen_twenty_min_ago_ssids))
-        ]
-        
-        for period, count in mac_stats:
-            message = f"{count} MACs added to the {period} list"
-            print(message)
-            self.log_file.write(f"{message}\n")
+        for period, macs in zip(WINDOW_PERIODS, self.mac_windows):
+            self._emit(f"{len(macs)} MACs added to the {period} list")
         
-        for period, count in ssid_stats:
-            message = f"{count} Probed SSIDs added to the {period} list"
-            print(message)
-            self.log_file.write(f"{message}\n")
+        for period, ssids in zip(WINDOW_PERIODS, self.ssid_windows):
+            self._emit(f"{len(ssids)} Probed SSIDs added to the {period} list")
     
     def process_current_activity(self, db: SecureKismetDB) -> None:
         """Process current activity and detect matches"""
         try:
             boundaries = self.time_manager.get_time_boundaries()
             
-            # Get current devices and probes
-            current_devices = db.get_devices_by_time_range(boundaries['current_time'])
+            # Get current devices and their probed SSIDs, extracted by SQLite
+            current_devices = db.get_device_probes_by_time_range(boundaries['current_time'])
             
             for device in current_devices:
                 mac = device['mac']
-                device_data = device.get('device_data', {})
                 
                 if not mac:
                     continue
                 
                 # Check for probe requests
-                self._process_probe_requests(device_data, mac)
+                self._process_probe_request(device['ssid'], mac)
                 
                 # Check MAC address tracking
                 self._process_mac_tracking(mac)
                 
         except Exception as e:
             logger.error(f"Error processing current activity: {e}")
+        finally:
+            self._flush_output()
     
-    def _process_probe_requests(self, device_data: Dict, mac: str) -> None:
-        """Process probe requests from device data"""
-        if not device_data:
+    def _process_probe_request(self, ssid: Optional[str], mac: str) -> None:
+        """Process a device's probed SSID"""
+        if not ssid or ssid in self.ssid_ignore_list:
             return
         
-        try:
-            dot11_device = device_data.get('dot11.device', {})
-            if not isinstance(dot11_device, dict):
-                return
-            
-            probe_record = dot11_device.get('dot11.device.last_probed_ssid_record', {})
-            if not isinstance(probe_record, dict):
-                return
-            
-            ssid = probe_record.get('dot11.probedssid.ssid', '')
-            if not ssid or ssid in self.ssid_ignore_list:
-                return
-            
-            # Log the probe
-            message = f'Found a probe!: {ssid}'
-            self.log_file.write(f'{message}\n')
-            logger.info(f"Probe detected from {mac}: {ssid}")
-            
-            # Check against historical lists
-            self._check_ssid_history(ssid)
-            
-        except (KeyError, TypeError, AttributeError) as e:
-            logger.debug(f"No probe data for device {mac}: {e}")
+        # Log the probe
+        message = f'Found a probe!: {ssid}'
+        self._emit(message, console=False)
+        logger.info(f"Probe detected from {mac}: {ssid}")
+        
+        # Check against historical lists
+        self._check_ssid_history(ssid)
     
     def _check_ssid_history(self, ssid: str) -> None:
         """Check SSID against historical tracking lists"""
-        if ssid in self.five_ten_min_ago_ssids:
-            message = f"Probe for {ssid} in 5 to 10 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Repeated probe detected: {ssid} (5-10 min window)")
-        
-        if ssid in self.ten_fifteen_min_ago_ssids:
-            message = f"Probe for {ssid} in 10 to 15 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Repeated probe detected: {ssid} (10-15 min window)")
-        
-        if ssid in self.fifteen_twenty_min_ago_ssids:
-            message = f"Probe for {ssid} in 15 to 20 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Repeated probe detected: {ssid} (15-20 min window)")
+        for ssids, (list_name, span) in zip(islice(self.ssid_windows, 1, None), HISTORY_LABELS):
+            if ssid in ssids:
+                self._emit(f"Probe for {ssid} in {list_name} list")
+                logger.warning(f"Repeated probe detected: {ssid} ({span} min window)")
     
     def _process_mac_tracking(self, mac: str) -> None:
-        """Process MAC address tracking"""
-        if mac.upper() in self.ignore_list:
+        """Process MAC address tracking (mac is upper-cased, like the tracking lists)"""
+        if mac in self.ignore_list:
             return
         
         # Check against historical lists
-        if mac in self.five_ten_min_ago_macs:
-            message = f"{mac} in 5 to 10 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Device reappeared: {mac} (5-10 min window)")
-        
-        if mac in self.ten_fifteen_min_ago_macs:
-            message = f"{mac} in 10 to 15 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Device reappeared: {mac} (10-15 min window)")
-        
-        if mac in self.fifteen_twenty_min_ago_macs:
-            message = f"{mac} in 15 to 20 mins list"
-            print(message)
-            self.log_file.write(f"{message}\n")
-            logger.warning(f"Device reappeared: {mac} (15-20 min window)")
+        for macs, (list_name, span) in zip(islice(self.mac_windows, 1, None), HISTORY_LABELS):
+            if mac in macs:
+                self._emit(f"{mac} in {list_name} list")
+                logger.warning(f"Device reappeared: {mac} ({span} min window)")
     
     def rotate_tracking_lists(self, db: SecureKismetDB) -> None:
         """Rotate tracking lists and update with fresh data"""
         try:
-            # Rotate MAC lists
-            self.fifteen_twenty_min_ago_macs = self.ten_fifteen_min_ago_macs
-            self.ten_fifteen_min_ago_macs = self.five_ten_min_ago_macs
-            self.five_ten_min_ago_macs = self.past_five_mins_macs
-            
-            # Rotate SSID lists
-            self.fifteen_twenty_min_ago_ssids = self.ten_fifteen_min_ago_ssids
-            self.ten_fifteen_min_ago_ssids = self.five_ten_min_ago_ssids
-            self.five_ten_min_ago_ssids = self.past_five_mins_ssids
-            
             # Get fresh data for past 5 minutes
             boundaries = self.time_manager.get_time_boundaries()
             
-            # Update past 5 minutes MAC list
-            macs = db.get_mac_addresses_by_time_range(boundaries['recent_time'])
-            self.past_five_mins_macs = self._filter_macs(macs)
+            # MACs and SSIDs share one scan of the window
+            db.set_ignored_macs(self.ignore_list)
+            (macs,), (ssids,) = db.get_activity_by_time_windows([(boundaries['recent_time'], None)])
             
-            # Update past 5 minutes SSID list
-            probes = db.get_probe_requests_by_time_range(boundaries['recent_time'])
-            self.past_five_mins_ssids = self._filter_ssids([p['ssid'] for p in probes])
+            # Every window ages by one slot and the oldest drops off the end
+            self.mac_windows.appendleft(macs)
+            self.ssid_windows.appendleft(self._filter_ssids(ssids))
             
             self._log_rotation_stats()
             
         except Exception as e:
             logger.error(f"Error rotating tracking lists: {e}")
+        finally:
+            self._flush_output()
     
     def _log_rotation_stats(self) -> None:
         """Log rotation statistics"""
-        print("Updated MAC tracking lists:")
-        print(f"- 15-20 min ago: {len(self.fifteen_twenty_min_ago_macs)}")
-        print(f"- 10-15 min ago: {len(self.ten_fifteen_min_ago_macs)}")
-        print(f"- 5-10 min ago: {len(self.five_ten_min_ago_macs)}")
-        print(f"- Current: {len(self.past_five_mins_macs)}")
+        current, five_ten, ten_fifteen, fifteen_twenty = self.mac_windows
+        self._emit("Updated MAC tracking lists:", log=False)
+        self._emit(f"- 15-20 min ago: {len(fifteen_twenty)}", log=False)
+        self._emit(f"- 10-15 min ago: {len(ten_fifteen)}", log=False)
+        self._emit(f"- 5-10 min ago: {len(five_ten)}", log=False)
+        self._emit(f"- Current: {len(current)}", log=False)
         
         # Log to file
-        self.log_file.write(f"{len(self.fifteen_twenty_min_ago_macs)} MACs moved to the 15-20 Min list\n")
-        self.log_file.write(f"{len(self.ten_fifteen_min_ago_macs)} MACs moved to the 10-15 Min list\n")
-        self.log_file.write(f"{len(self.five_ten_min_ago_macs)} MACs moved to the 5 to 10 mins ago list\n")
-        
-        print(f"{len(self.fifteen_twenty_min_ago_ssids)} Probed SSIDs moved to the 15 to 20 mins ago list")
-        print(f"{len(self.ten_fifteen_min_ago_ssids)} Probed SSIDs moved to the 10 to 15 mins ago list")
-        print(f"{len(self.five_ten_min_ago_ssids)} Probed SSIDs moved to the 5 to 10 mins ago list")
-        
-        self.log_file.write(f"{len(self.fifteen_twenty_min_ago_ssids)} Probed SSIDs moved to the 15 to 20 mins ago list\n")
-        self.log_file.write(f"{len(self.ten_fifteen_min_ago_ssids)} Probed SSIDs moved to the 10 to 15 mins ago list\n")
-        self.log_file.write(f"{len(self.five_ten_min_ago_ssids)} Probed SSIDs moved to the 5 to 10 mins ago list\n")
\ No newline at end of file
+        self._emit(f"{len(fifteen_twenty)} MACs moved to the 15-20 Min list", console=False)
+        self._emit(f"{len(ten_fifteen)} MACs moved to the 10-15 Min list", console=False)
+        self._emit(f"{len(five_ten)} MACs moved to the 5 to 10 mins ago list", console=False)
+        
+        _, five_ten, ten_fifteen, fifteen_twenty = self.ssid_windows
+        self._emit(f"{len(fifteen_twenty)} Probed SSIDs moved to the 15 to 20 mins ago list")
+        self._emit(f"{len(ten_fifteen)} Probed SSIDs moved to the 10 to 15 mins ago list")
+        self._emit(f"{len(five_ten)} Probed SSIDs moved to the 5 to 10 mins ago list")
@@ -4,15 +4,22 @@ Integrated Surveillance Analysis Tool for CYT
 Combines GPS tracking, device detection, and KML export for stalking/surveillance detection
 """
 import argparse
+import fnmatch
 import glob
 import json
 import logging
+import math
 import os
+import sqlite3
+import sys
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from surveillance_detector import SurveillanceDetector, load_appearances_from_kismet
+from surveillance_detector import (SurveillanceDetector, SuspiciousDevice, iter_kismet_appearances,
+                                   load_appearances_from_kismet, open_kismet_database, read_kismet_appearances)
 from gps_tracker import GPSTracker, KMLExporter, simulate_gps_data
 from secure_credentials import secure_config_loader
 
@@ -28,6 +35,109 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Side of a GPS grid cell in degrees of latitude (~50 m)
+GPS_CELL_DEGREES = 0.00045
+
+# Earliest GPS fix in each grid cell with how many devices were seen there, so
+# the per-database GPS count and the deduplicated coordinates come from one
+# scan. A degree of longitude shrinks with cos(latitude), so longitude is
+# scaled by it to keep cells ~50 m wide away from the equator. The bare
+# avg_lat/avg_lon come from the row holding MIN(first_time).
+GPS_COORDINATES_QUERY = """
+    SELECT CAST(avg_lat / :cell AS INTEGER) AS lat_cell,
+           CAST(avg_lon * cos(radians(avg_lat)) / :cell AS INTEGER) AS lon_cell,
+           avg_lat, avg_lon, MIN(first_time), COUNT(*)
+    FROM devices
+    WHERE avg_lat != 0 AND avg_lon != 0
+    GROUP BY lat_cell, lon_cell
+    ORDER BY 5, lat_cell, lon_cell
+"""
+
+# Smaller files cannot hold a populated devices table next to Kismet's schema
+MIN_KISMET_DB_BYTES = 64 * 1024
+
+# Device counts of databases already read, keyed by path and valid while the
+# file's mtime and size are unchanged, so known-empty captures are not reopened
+DB_CACHE_PATH = Path.home() / '.cyt' / 'db_cache.json'
+
+def _load_db_cache() -> Dict[str, dict]:
+    """Load the database cache, or an empty one if it is missing or unreadable"""
+    try:
+        with open(DB_CACHE_PATH, 'r') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_db_cache(cache: Dict[str, dict]) -> None:
+    """Save the database cache; failing to is not an analysis error"""
+    try:
+        DB_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(DB_CACHE_PATH, 'w') as f:
+            json.dump(cache, f, separators=(',', ':'))
+    except OSError as e:
+        logger.debug(f"Could not save database cache {DB_CACHE_PATH}: {e}")
+
+def _is_known_empty(cache: Dict[str, dict], db_path: str, mtime: float, size: int) -> bool:
+    """Whether db_path had no devices when last read and has not changed since"""
+    entry = cache.get(db_path)
+    return bool(entry) and entry.get('mtime') == mtime and entry.get('size') == size and entry.get('devices') == 0
+
+def _ensure_math_functions(conn: sqlite3.Connection) -> None:
+    """Provide cos() and radians() on SQLite builds without the math functions"""
+    try:
+        conn.execute("SELECT cos(radians(0))")
+    except sqlite3.OperationalError:
+        conn.create_function('cos', 1, math.cos)
+        conn.create_function('radians', 1, math.radians)
+
+def _find_kismet_databases(db_pattern: str) -> List[Tuple[str, float, int, str]]:
+    """
+    Find files matching db_pattern along with their modification times, sizes and names
+    
+    Each directory is scanned once and every match is stat()ed once, so
+    callers can filter and sort on the returned mtime without touching the
+    filesystem again.
+    
+    Returns:
+        List of (path, mtime, size, file name) tuples
+    """
+    parent, name_pattern = os.path.split(db_pattern)
+    directories = glob.glob(parent) if glob.has_magic(parent) else [parent]
+    
+    matches = []
+    for directory in directories:
+        try:
+            with os.scandir(directory or '.') as entries:
+                for entry in entries:
+                    # Like glob, leave dotfiles out unless the pattern asks for them
+                    if entry.name.startswith('.') and not name_pattern.startswith('.'):
+                        continue
+                    if fnmatch.fnmatch(entry.name, name_pattern) and entry.is_file():
+                        stat = entry.stat()
+                        matches.append((os.path.join(directory, entry.name), stat.st_mtime, stat.st_size, entry.name))
+        except OSError:
+            continue
+    return matches
+
+def _device_to_json(obj):
+    """json.dump default hook that serializes a SuspiciousDevice as it is written"""
+    if isinstance(obj, SuspiciousDevice):
+        return {
+            'mac': obj.mac,
+            'persistence_score': obj.persistence_score,
+            'total_appearances': obj.total_appearances,
+            'locations_seen': obj.locations_seen,
+            'reasons': obj.reasons,
+            'first_seen': obj.first_seen.isoformat(),
+            'last_seen': obj.last_seen.isoformat()
+        }
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _future_rows(future: Future) -> Iterator[tuple]:
+    """Rows from a read_kismet_appearances() future, raising any read error where they are consumed"""
+    yield from future.result()
+
 class SurveillanceAnalyzer:
     """Main surveillance analysis orchestrator"""
     
@@ -44,6 +154,10 @@ class SurveillanceAnalyzer:
         # Analysis settings
         self.analysis_window_hours = 24  # Analyze last 24 hours by default
         
+        # Kismet connections open during one analysis, so the GPS and
+        # appearance passes over a database share a warm page cache
+        self._kismet_connections = {}
+        
     def analyze_kismet_data(self, kismet_db_path: str = None, 
                           gps_data: list = None) -> dict:
         """Perform complete surveillance analysis on Kismet data"""
@@ -51,107 +165,121 @@ class SurveillanceAnalyzer:
         print("🔍 Starting Surveillance Analysis...")
         print("=" * 50)
         
+        # GPS fixes read while counting, reused when extracting coordinates
+        gps_by_db = {}
+        
+        # (mtime, size) of each database found from the configured pattern,
+        # whose device counts are cached
+        discovered_dbs = {}
+        db_cache = {}
+        
+        # File name shown for each database in progress output
+        db_names = {}
+        
         # Find all Kismet databases from past 24 hours
         if not kismet_db_path:
             db_pattern = self.config['paths']['kismet_logs']
-            all_db_files = glob.glob(db_pattern)
+            all_db_files = _find_kismet_databases(db_pattern)
             if not all_db_files:
                 raise FileNotFoundError(f"No Kismet database found at: {db_pattern}")
             
             # Filter to databases modified in the past 24 hours
-            import sqlite3
             current_time = time.time()
             hours_24_ago = current_time - (self.analysis_window_hours * 3600)
             
-            recent_db_files = [db for db in all_db_files if os.path.getmtime(db) >= hours_24_ago]
-            recent_db_files = sorted(recent_db_files, key=os.path.getmtime, reverse=True)
+            # Skip, unopened, files too small to hold devices and unchanged
+            # ones that had none when last read
+            db_cache = _load_db_cache()
+            usable_dbs = [(db, mtime) for db, mtime, size, _ in all_db_files
+                          if size >= MIN_KISMET_DB_BYTES and not _is_known_empty(db_cache, db, mtime, size)]
+            recent_dbs = [(db, mtime) for db, mtime in usable_dbs if mtime >= hours_24_ago]
+            recent_dbs.sort(key=lambda db: db[1], reverse=True)
+            recent_db_files = [db for db, _ in recent_dbs]
+            db_names = {db: name for db, _, _, name in all_db_files}
+            discovered_dbs = {db: (mtime, size) for db, mtime, size, _ in all_db_files}
             
             if not recent_db_files:
-                print(f"⚠️ No databases found from past {self.analysis_window_hours} hours, using most recent")
-                kismet_db_path = max(all_db_files, key=os.path.getmtime)
+                skipped_count = sum(1 for _, mtime, _, _ in all_db_files if mtime >= hours_24_ago)
+                if skipped_count:
+                    print(f"⚠️ Skipped {skipped_count} databases from past {self.analysis_window_hours} hours "
+                          f"as too small or empty")
+                else:
+                    print(f"⚠️ No databases found from past {self.analysis_window_hours} hours")
+                if not usable_dbs:
+                    raise FileNotFoundError(f"No Kismet database with devices found at: {db_pattern}")
+                print("   Using the most recent database with devices")
+                kismet_db_path = max(usable_dbs, key=lambda db: db[1])[0]
             else:
                 print(f"📊 Found {len(recent_db_files)} databases from past {self.analysis_window_hours} hours:")
-                total_gps_coords = 0
-                for db_file in recent_db_files:
-                    try:
-                        conn = sqlite3.connect(db_file)
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT COUNT(*) FROM devices WHERE avg_lat != 0 AND avg_lon != 0")
-                        gps_count = cursor.fetchone()[0]
-                        conn.close()
-                        print(f"   📁 {os.path.basename(db_file)}: {gps_count} GPS locations")
-                        total_gps_coords += gps_count
-                    except:
-                        print(f"   ❌ {os.path.basename(db_file)}: Error reading")
-                
-                print(f"🛰️ Total GPS coordinates across all databases: {total_gps_coords}")
+                # Caller-supplied GPS replaces the Kismet coordinates, so skip the preview scans
+                if gps_data is None:
+                    total_gps_coords = 0
+                    for db_file in recent_db_files:
+                        try:
+                            gps_by_db[db_file] = self._read_gps_coordinates(db_file)
+                            gps_count = sum(row[-1] for row in gps_by_db[db_file])
+                            print(f"   📁 {db_names[db_file]}: {gps_count} GPS locations")
+                            total_gps_coords += gps_count
+                        except:
+                            print(f"   ❌ {db_names[db_file]}: Error reading")
+                    
+                    print(f"🛰️ Total GPS coordinates across all databases: {total_gps_coords}")
                 # We'll process all recent databases, not just one
                 kismet_db_path = recent_db_files  # Pass list instead of single file
         
         # Handle multiple database files
         db_files_to_process = kismet_db_path if isinstance(kismet_db_path, list) else [kismet_db_path]
+        for db_file in db_files_to_process:
+            if db_file not in db_names:
+                db_names[db_file] = os.path.basename(db_file)
         print(f"📊 Processing {len(db_files_to_process)} Kismet database(s)")
         
         # Load GPS data (real, simulated, or extract from Kismet)
         if gps_data:
             print(f"🛰️ Loading {len(gps_data)} GPS coordinates...")
+            location_lines = []
             for lat, lon, name in gps_data:
                 location_id = self.gps_tracker.add_gps_reading(lat, lon, location_name=name)
-                print(f"   📍 {name}: {lat:.4f}, {lon:.4f} -> {location_id}")
+                location_lines.append(f"   📍 {name}: {lat:.4f}, {lon:.4f} -> {location_id}\n")
+            # One write for the whole list instead of a print per point
+            sys.stdout.write(''.join(location_lines))
         else:
             # Extract GPS coordinates from all Kismet databases
             print("🛰️ Extracting GPS coordinates from Kismet databases...")
             try:
-                import sqlite3
-                all_gps_coords = []
+                # Earliest (lat, lon, first_time) per ~50 m grid cell across all databases
+                earliest_by_cell = {}
                 
                 for db_file in db_files_to_process:
                     try:
-                        conn = sqlite3.connect(db_file)
-                        cursor = conn.cursor()
-                        
                         # Get GPS locations with timestamps from this database
-                        cursor.execute("""
-                            SELECT DISTINCT avg_lat, avg_lon, first_time
-                            FROM devices 
-                            WHERE avg_lat != 0 AND avg_lon != 0 
-                            ORDER BY first_time
-                        """)
+                        gps_rows = gps_by_db.get(db_file)
+                        if gps_rows is None:
+                            gps_rows = self._read_gps_coordinates(db_file)
                         
-                        db_coords = cursor.fetchall()
-                        conn.close()
-                        
-                        if db_coords:
-                            print(f"   📁 {os.path.basename(db_file)}: {len(db_coords)} GPS locations")
-                            all_gps_coords.extend(db_coords)
+                        if gps_rows:
+                            print(f"   📁 {db_names[db_file]}: {len(gps_rows)} GPS locations")
+                        for lat_cell, lon_cell, lat, lon, first_time, _ in gps_rows:
+                            earliest = earliest_by_cell.get((lat_cell, lon_cell))
+                            if earliest is None or first_time < earliest[2]:
+                                earliest_by_cell[(lat_cell, lon_cell)] = (lat, lon, first_time)
                         
                     except Exception as e:
-                        print(f"   ❌ Error reading {os.path.basename(db_file)}: {e}")
+                        print(f"   ❌ Error reading {db_names[db_file]}: {e}")
                         continue
                 
-                if all_gps_coords:
-                    # Sort all coordinates by timestamp and deduplicate nearby points
-                    all_gps_coords.sort(key=lambda x: x[2])  # Sort by timestamp
+                if earliest_by_cell:
+                    # Nearby points are already deduplicated; walk the cells in time order
+                    all_gps_coords = sorted(earliest_by_cell.values(), key=lambda x: x[2])
                     
                     gps_data = []
-                    prev_lat, prev_lon = None, None
-                    location_counter = 1
-                    
-                    for lat, lon, timestamp in all_gps_coords:
-                        # Skip if too close to previous point (within ~50m)
-                        if prev_lat and prev_lon:
-                            import math
-                            distance = math.sqrt((lat - prev_lat)**2 + (lon - prev_lon)**2) * 111000  # rough meters
-                            if distance < 50:
-                                continue
-                        
+                    location_lines = []
+                    for location_counter, (lat, lon, _) in enumerate(all_gps_coords, 1):
                         location_name = f"Location_{location_counter}"
                         location_id = self.gps_tracker.add_gps_reading(lat, lon, location_name=location_name)
-                        print(f"   📍 {location_name}: {lat:.6f}, {lon:.6f}")
+                        location_lines.append(f"   📍 {location_name}: {lat:.6f}, {lon:.6f}\n")
                         gps_data.append((lat, lon, location_name))
-                        
-                        prev_lat, prev_lon = lat, lon
-                        location_counter += 1
+                    sys.stdout.write(''.join(location_lines))
                     
                     print(f"🛰️ Total unique GPS locations: {len(gps_data)}")
                 else:
@@ -166,20 +294,49 @@ class SurveillanceAnalyzer:
         # Load device appearances from Kismet databases
         print("📡 Loading device appearances from Kismet databases...")
         total_count = 0
-        
-        if gps_data:
-            # Load devices from all databases, associating them with GPS locations
-            primary_location = "Location_1"  # Use the first/primary location
-            for db_file in db_files_to_process:
-                db_count = self._load_appearances_with_gps(db_file, primary_location)
-                print(f"   📁 {os.path.basename(db_file)}: {db_count} device appearances")
-                total_count += db_count
-        else:
-            # Load from all databases without GPS correlation
-            for db_file in db_files_to_process:
-                db_count = load_appearances_from_kismet(db_file, self.detector, "unknown_location")
-                print(f"   📁 {os.path.basename(db_file)}: {db_count} device appearances")
+        primary_location = "Location_1"  # Use the first/primary location
+        
+        # Databases are independent, so several are read across processes
+        # while their appearances are merged here in the original order. With
+        # one CPU the workers only add start-up and pickling, so it reads here.
+        executor = None
+        cpu_count = os.cpu_count() or 1
+        if len(db_files_to_process) > 1 and cpu_count > 1:
+            # The workers open their own connections; the GPS pass's ones are
+            # closed first so no open SQLite handle is carried across fork()
+            self._close_kismet_connections()
+            executor = ProcessPoolExecutor(max_workers=min(len(db_files_to_process), cpu_count))
+        try:
+            pending = [executor.submit(read_kismet_appearances, db_file) if executor else None
+                       for db_file in db_files_to_process]
+            for db_file, future in zip(db_files_to_process, pending):
+                rows = _future_rows(future) if future else self._iter_appearances(db_file)
+                if gps_data:
+                    # Load devices from all databases, associating them with GPS locations
+                    db_count = self._load_appearances_with_gps(db_file, primary_location, rows)
+                else:
+                    # Load from all databases without GPS correlation
+                    db_count = load_appearances_from_kismet(db_file, self.detector, "unknown_location", rows)
+                if db_count is None:
+                    # Locked, malformed or half-written: not known to be empty,
+                    # so it is read again next run
+                    print(f"   ❌ {db_names[db_file]}: Error reading")
+                    db_cache.pop(db_file, None)
+                    continue
+                print(f"   📁 {db_names[db_file]}: {db_count} device appearances")
                 total_count += db_count
+                if db_file in discovered_dbs:
+                    # Keyed to the file as discovered, so a capture that grew
+                    # while being read is read again next run
+                    mtime, size = discovered_dbs[db_file]
+                    db_cache[db_file] = {'mtime': mtime, 'size': size, 'devices': db_count}
+        finally:
+            if executor:
+                executor.shutdown()
+            self._close_kismet_connections()
+        if discovered_dbs:
+            # Entries for databases that no longer match the pattern are dropped
+            _save_db_cache({db: entry for db, entry in db_cache.items() if db in discovered_dbs})
         
         print(f"✅ Total device appearances loaded: {total_count:,}")
         
@@ -208,7 +365,11 @@ class SurveillanceAnalyzer:
         print(f"\\n📝 Generating surveillance reports:")
         print(f"   📄 Markdown: {report_file}")
         print(f"   🌐 HTML: {html_file}")
+        
         surveillance_report = self.detector.generate_surveillance_report(report_file)
+        if not os.path.exists(html_file):
+            # pandoc failures are only logged by the detector
+            print("⚠️ HTML report was not generated (is pandoc installed?), see surveillance_analysis.log")
         
         # Generate KML file if GPS data available
         kml_file = None
@@ -265,133 +426,125 @@ class SurveillanceAnalyzer:
         """Specifically analyze for stalking patterns"""
         suspicious_devices = self.detector.analyze_surveillance_patterns()
         
-        # Filter for high-threat stalking indicators
+        # Filter for high-threat stalking indicators. Devices come back sorted
+        # by persistence score, so the rest are below the cut once one is.
         stalking_candidates = []
         for device in suspicious_devices:
-            if device.persistence_score >= min_persistence_score:
-                # Additional stalking-specific checks
-                locations = len(device.locations_seen)
-                appearances = device.total_appearances
-                
-                # Stalking indicators:
-                # - Appears at 3+ different locations
-                # - High frequency of appearances
-                # - Spans multiple days
-                time_span = device.last_seen - device.first_seen
-                time_span_hours = time_span.total_seconds() / 3600
-                
-                stalking_score = 0
-                stalking_reasons = []
-                
-                if locations >= 3:
-                    stalking_score += 0.4
-                    stalking_reasons.append(f"Follows across {locations} locations")
-                
-                if appearances >= 10:
-                    stalking_score += 0.3
-                    stalking_reasons.append(f"High frequency ({appearances} appearances)")
-                
-                if time_span_hours >= 24:
-                    stalking_score += 0.3
-                    stalking_reasons.append(f"Persistent over {time_span_hours/24:.1f} days")
-                
-                if stalking_score >= 0.6:
-                    device.stalking_score = stalking_score
-                    device.stalking_reasons = stalking_reasons
-                    stalking_candidates.append(device)
+            if device.persistence_score < min_persistence_score:
+                break
+            
+            # Additional stalking-specific checks
+            locations = len(device.locations_seen)
+            appearances = device.total_appearances
+            
+            # Stalking indicators:
+            # - Appears at 3+ different locations
+            # - High frequency of appearances
+            # - Spans multiple days
+            time_span = device.last_seen - device.first_seen
+            time_span_hours = time_span.total_seconds() / 3600
+            
+            many_locations = locations >= 3
+            high_frequency = appearances >= 10
+            multi_day = time_span_hours >= 24
+            
+            stalking_score = 0
+            if many_locations:
+                stalking_score += 0.4
+            if high_frequency:
+                stalking_score += 0.3
+            if multi_day:
+                stalking_score += 0.3
+            
+            if stalking_score < 0.6:
+                continue
+            
+            # Reasons are only worth formatting for devices that are flagged
+            stalking_reasons = []
+            if many_locations:
+                stalking_reasons.append(f"Follows across {locations} locations")
+            if high_frequency:
+                stalking_reasons.append(f"High frequency ({appearances} appearances)")
+            if multi_day:
+                stalking_reasons.append(f"Persistent over {time_span_hours/24:.1f} days")
+            
+            device.stalking_score = stalking_score
+            device.stalking_reasons = stalking_reasons
+            stalking_candidates.append(device)
         
         return stalking_candidates
     
     def export_results_json(self, results: dict, output_file: str) -> None:
         """Export analysis results to JSON for further processing"""
         
-        # Convert device objects to serializable format
-        serializable_results = results.copy()
-        if 'suspicious_device_list' in results:
-            device_list = []
-            for device in results['suspicious_device_list']:
-                device_dict = {
-                    'mac': device.mac,
-                    'persistence_score': device.persistence_score,
-                    'total_appearances': device.total_appearances,
-                    'locations_seen': device.locations_seen,
-                    'reasons': device.reasons,
-                    'first_seen': device.first_seen.isoformat(),
-                    'last_seen': device.last_seen.isoformat()
-                }
-                device_list.append(device_dict)
-            serializable_results['suspicious_device_list'] = device_list
-        
+        # json.dump writes chunk by chunk and converts each device object as
+        # it reaches it, so no serializable copy of the results is built
         with open(output_file, 'w') as f:
-            json.dump(serializable_results, f, indent=2)
+            json.dump(results, f, indent=2, default=_device_to_json)
         
         print(f"📊 Results exported to JSON: {output_file}")
     
-    def _load_appearances_with_gps(self, db_path: str, location_id: str) -> int:
-        """Load device appearances and register them with GPS tracker"""
-        import sqlite3
-        import json
-        
+    def _kismet_connection(self, db_path: str) -> sqlite3.Connection:
+        """Connection to db_path, opened on first use and kept until the analysis finishes"""
+        conn = self._kismet_connections.get(db_path)
+        if conn is None:
+            conn = open_kismet_database(db_path)
+            self._kismet_connections[db_path] = conn
+        return conn
+    
+    def _close_kismet_connections(self) -> None:
+        """Close every connection opened by _kismet_connection()"""
+        for conn in self._kismet_connections.values():
+            conn.close()
+        self._kismet_connections.clear()
+    
+    def _iter_appearances(self, db_path: str) -> Iterator[tuple]:
+        """Appearance rows over the shared connection, opened lazily inside the loader's error handling"""
+        yield from iter_kismet_appearances(db_path, self._kismet_connection(db_path))
+    
+    def _read_gps_coordinates(self, db_path: str) -> list:
+        """(lat_cell, lon_cell, lat, lon, first_time, device_count) for each GPS grid cell in a Kismet database"""
+        conn = self._kismet_connection(db_path)
+        _ensure_math_functions(conn)
+        return conn.execute(GPS_COORDINATES_QUERY, {'cell': GPS_CELL_DEGREES}).fetchall()
+    
+    def _load_appearances_with_gps(self, db_path: str, location_id: str,
+                                   rows: Iterable[tuple] = None) -> Optional[int]:
+        """
+        Load device appearances and register them with GPS tracker
+        
+        Args:
+            rows: Appearance rows already read from db_path, e.g. by a worker
+                  process; read from the database when None
+        
+        Returns:
+            Number of appearances loaded, or None if the database could not be read
+        """
         try:
-            with sqlite3.connect(db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Get all devices with timestamps
-                cursor.execute("""
-                    SELECT devmac, last_time, type, device 
-                    FROM devices 
-                    WHERE last_time > 0
-                    ORDER BY last_time DESC
-                """)
-                
-                rows = cursor.fetchall()
-                count = 0
-                
-                # Set current location in GPS tracker for device correlation
-                if hasattr(self.gps_tracker, 'location_sessions') and self.gps_tracker.location_sessions:
-                    # Find the location session that matches our location_id
-                    for session in self.gps_tracker.location_sessions:
-                        if session.session_id == location_id:
-                            self.gps_tracker.current_location = session
-                            break
-                
-                for row in rows:
-                    mac, timestamp, device_type, device_json = row
-                    
-                    # Extract SSIDs from device JSON
-                    ssids_probed = []
-                    try:
-                        device_data = json.loads(device_json)
-                        dot11_device = device_data.get('dot11.device', {})
-                        if dot11_device:
-                            probe_record = dot11_device.get('dot11.device.last_probed_ssid_record', {})
-                            ssid = probe_record.get('dot11.probedssid.ssid')
-                            if ssid:
-                                ssids_probed = [ssid]
-                    except (json.JSONDecodeError, KeyError):
-                        pass
-                    
-                    # Add to surveillance detector
-                    self.detector.add_device_appearance(
-                        mac=mac,
-                        timestamp=timestamp,
-                        location_id=location_id,
-                        ssids_probed=ssids_probed,
-                        device_type=device_type
-                    )
-                    
-                    # Also add to GPS tracker if current location is set
-                    if self.gps_tracker.current_location:
-                        self.gps_tracker.add_device_at_current_location(mac)
-                    
-                    count += 1
-                
-                logger.info(f"Loaded {count} device appearances from {db_path}")
-                return count
-                
+            # Rows are walked twice, once per tracker, and are small without the device JSON
+            rows = list(self._iter_appearances(db_path) if rows is None else rows)
+            
+            # Set current location in GPS tracker for device correlation
+            session = self.gps_tracker.get_session(location_id)
+            if session:
+                self.gps_tracker.current_location = session
+            
+            # Add to surveillance detector
+            count = self.detector.add_device_appearances(
+                ((mac, timestamp, [ssid] if ssid else [], device_type) for mac, timestamp, device_type, ssid in rows),
+                location_id
+            )
+            
+            # Also add to GPS tracker if current location is set
+            if self.gps_tracker.current_location:
+                self.gps_tracker.add_devices_at_current_location(mac for mac, _, _, _ in rows)
+            
+            logger.info(f"Loaded {count} device appearances from {db_path}")
+            return count
+            
         except Exception as e:
             logger.error(f"Error loading from Kismet database: {e}")
-            return 0
+            return None
 
 def main():
     """Main CLI interface"""
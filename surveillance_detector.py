@@ -2,17 +2,97 @@
 Surveillance Detection System for CYT
 Detects devices that may be following or tracking the user
 """
-import json
+import heapq
+import re
 import sqlite3
 import logging
+from sys import intern
+from contextlib import closing
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional
+from dataclasses import dataclass, field
+from functools import lru_cache
+from array import array
 from collections import defaultdict
+from itertools import islice
 import pathlib
 
+from secure_database import PROBED_SSID_PATH
+
 logger = logging.getLogger(__name__)
 
+# Tuning for the one-off full scans of Kismet's devices table during analysis
+KISMET_SCAN_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",  # Map up to 256 MB instead of read() per page
+    "PRAGMA cache_size=-65536",    # ~64 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Every device with a last_time and the SSID of its last probe request (NULL
+# when it has none), so only that string leaves SQLite instead of the whole
+# device JSON. json_valid() guards the JSON1 calls, which otherwise fail the
+# entire query on one malformed blob.
+KISMET_APPEARANCES_QUERY = f"""
+    SELECT devmac, last_time, type,
+           CASE WHEN json_valid(device_json) THEN
+               CASE WHEN json_type(device_json, '{PROBED_SSID_PATH}') = 'text'
+               THEN json_extract(device_json, '{PROBED_SSID_PATH}') END
+           END AS ssid
+    FROM (SELECT devmac, last_time, type, CAST(device AS TEXT) AS device_json
+          FROM devices WHERE last_time > 0)
+    ORDER BY last_time DESC
+"""
+
+# Rows pulled per fetchmany() while streaming the devices table
+FETCH_BATCH_SIZE = 2048
+
+# Probed SSIDs containing any of these (case-insensitive) are treated as anomalous,
+# matched with one precompiled alternation rather than a substring test each
+SUSPICIOUS_SSID_PATTERNS = ('surveillance', 'monitor', 'track', 'spy', 'watch', 'police', 'fbi')
+SUSPICIOUS_SSID_RE = re.compile('|'.join(map(re.escape, SUSPICIOUS_SSID_PATTERNS)), re.IGNORECASE)
+
+def open_kismet_database(db_path: str) -> sqlite3.Connection:
+    """
+    Open a Kismet database read-only, tuned for large scans
+    
+    Captures are opened with mode=ro so analysis never changes them: no
+    indexes, journal switches or timestamp changes, even on a capture Kismet
+    is still writing.
+    """
+    conn = sqlite3.connect(f"{pathlib.Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    for pragma in KISMET_SCAN_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def iter_kismet_rows(cursor: sqlite3.Cursor) -> Iterator[tuple]:
+    """Yield an executed cursor's rows in FETCH_BATCH_SIZE batches instead of fetchall()"""
+    cursor.arraysize = FETCH_BATCH_SIZE
+    while True:
+        batch = cursor.fetchmany()
+        if not batch:
+            break
+        yield from batch
+
+# Local-time offsets and DST changes fall on quarter-hour boundaries, so the
+# local hour and weekday are the same for every timestamp in a 15-minute slot
+LOCAL_TIME_SLOT_SECONDS = 900
+
+# Hour-of-day and weekday classes as bitmasks: bit h is set when hour (or
+# weekday) h belongs to the class, so a test is one shift-and-mask
+OFF_HOURS_MASK = sum(1 << hour for hour in (22, 23, 0, 1, 2, 3, 4, 5, 6))  # 10 PM to 6 AM
+WORK_HOURS_MASK = sum(1 << hour for hour in range(9, 18))                  # 9 AM to 5 PM
+WEEKDAYS_MASK = sum(1 << day for day in range(5))                          # Monday = 0, Friday = 4
+
+@lru_cache(maxsize=None)
+def _local_slot_hour_weekday(slot: int) -> Tuple[int, int]:
+    """Local (hour, weekday) shared by every timestamp in a slot"""
+    moment = datetime.fromtimestamp(slot * LOCAL_TIME_SLOT_SECONDS)
+    return moment.hour, moment.weekday()
+
+def local_hour_weekday(timestamp: float) -> Tuple[int, int]:
+    """Local (hour, weekday) of a timestamp without building a datetime per call"""
+    return _local_slot_hour_weekday(int(timestamp // LOCAL_TIME_SLOT_SECONDS))
+
 @dataclass
 class DeviceAppearance:
     """Record of when/where a device was seen"""
@@ -23,6 +103,219 @@ class DeviceAppearance:
     signal_strength: Optional[float] = None
     device_type: Optional[str] = None
 
+class DeviceHistory:
+    """
+    One device's appearances stored column-wise
+    
+    Timestamps go into a packed array('d') and the other fields into parallel
+    lists, so recording an appearance allocates no per-appearance object.
+    DeviceAppearance objects are only built, and then cached, when a caller
+    asks for them (in practice the few devices that get flagged).
+    """
+    __slots__ = ('mac', 'timestamps', 'location_ids', 'ssids_probed', 'signal_strengths',
+                 'device_types', '_appearances')
+    
+    def __init__(self, mac: str):
+        self.mac = mac
+        self.timestamps = array('d')
+        self.location_ids = []
+        self.ssids_probed = []
+        self.signal_strengths = []
+        self.device_types = []
+        self._appearances = None
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+    
+    def append(self, timestamp: float, location_id: str, ssids_probed: List[str],
+               signal_strength: Optional[float], device_type: Optional[str]) -> None:
+        self.timestamps.append(timestamp)
+        self.location_ids.append(location_id)
+        self.ssids_probed.append(ssids_probed)
+        self.signal_strengths.append(signal_strength)
+        self.device_types.append(device_type)
+        self._appearances = None
+    
+    def retain_since(self, cutoff: float) -> int:
+        """Drop appearances older than cutoff, returning how many were dropped"""
+        keep = [i for i, timestamp in enumerate(self.timestamps) if timestamp >= cutoff]
+        dropped = len(self.timestamps) - len(keep)
+        if dropped:
+            self.timestamps = array('d', (self.timestamps[i] for i in keep))
+            self.location_ids = [self.location_ids[i] for i in keep]
+            self.ssids_probed = [self.ssids_probed[i] for i in keep]
+            self.signal_strengths = [self.signal_strengths[i] for i in keep]
+            self.device_types = [self.device_types[i] for i in keep]
+            self._appearances = None
+        return dropped
+    
+    def appearances(self) -> List[DeviceAppearance]:
+        """The appearances in recording order as DeviceAppearance objects"""
+        if self._appearances is None:
+            mac = self.mac
+            self._appearances = [
+                DeviceAppearance(mac, timestamp, location_id, list(ssids_probed), signal_strength, device_type)
+                for timestamp, location_id, ssids_probed, signal_strength, device_type in zip(
+                    self.timestamps, self.location_ids, self.ssids_probed,
+                    self.signal_strengths, self.device_types)
+            ]
+        return self._appearances
+
+@dataclass
+class DeviceStats:
+    """Running aggregates for one device, updated as each appearance is recorded"""
+    count: int = 0
+    first_seen: Optional[float] = None
+    last_seen: Optional[float] = None
+    off_hours: int = 0
+    locations: Set[str] = field(default_factory=set)
+    ssids: Set[str] = field(default_factory=set)
+    suspicious_ssids: int = 0
+    # Welford mean/M2 of the gaps between consecutive appearances. Only valid
+    # while appearances arrive in time order (either direction, as Kismet
+    # returns them newest first); interval_direction is None once they don't.
+    previous_timestamp: Optional[float] = None
+    interval_direction: Optional[int] = 0
+    interval_mean: float = 0.0
+    interval_m2: float = 0.0
+    
+    def add(self, timestamp: float, location_id: str, ssids_probed: List[str]) -> None:
+        """Fold one appearance into the aggregates"""
+        self.count += 1
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+        
+        self.off_hours += (OFF_HOURS_MASK >> local_hour_weekday(timestamp)[0]) & 1
+        
+        self.locations.add(location_id)
+        for ssid in ssids_probed:
+            if ssid not in self.ssids:
+                self.ssids.add(ssid)
+                if SUSPICIOUS_SSID_RE.search(ssid):
+                    self.suspicious_ssids += 1
+        
+        previous = self.previous_timestamp
+        self.previous_timestamp = timestamp
+        if previous is None or self.interval_direction is None:
+            return
+        delta = timestamp - previous
+        direction = (delta > 0) - (delta < 0)
+        if direction:
+            if self.interval_direction and direction != self.interval_direction:
+                self.interval_direction = None
+                return
+            self.interval_direction = direction
+        interval = abs(delta)
+        intervals = self.count - 1
+        difference = interval - self.interval_mean
+        self.interval_mean += difference / intervals
+        self.interval_m2 += difference * (interval - self.interval_mean)
+    
+    def interval_variance(self) -> Optional[float]:
+        """Variance of the gaps between appearances, or None if they arrived out of order"""
+        if self.interval_direction is None or self.count < 2:
+            return None
+        return self.interval_m2 / (self.count - 1)
+
+@dataclass
+class DeviceFeatures:
+    """Per-device values derived from the full history, shared by the analysis passes"""
+    appearances: List[DeviceAppearance]  # Sorted by timestamp
+    timestamps: List[float]              # Sorted
+    hours: List[int]
+    weekdays: List[int]
+
+def _interval_stats(timestamps: List[float]) -> Tuple[float, float]:
+    """Mean and variance of the gaps between sorted timestamps, in one Welford pass"""
+    mean = 0.0
+    m2 = 0.0
+    count = 0
+    previous = timestamps[0]
+    for timestamp in islice(timestamps, 1, None):
+        interval = timestamp - previous
+        previous = timestamp
+        count += 1
+        delta = interval - mean
+        mean += delta / count
+        m2 += delta * (interval - mean)
+    return mean, m2 / count
+
+def calculate_persistence_score(appearance_count: int, first_seen: float, last_seen: float,
+                                location_count: int) -> Tuple[float, List[str]]:
+    """
+    Simple persistence scoring: just detect devices that appear frequently over time
+    
+    Works from a device's aggregates alone, so it needs no appearance list and
+    can be called from any process.
+    
+    Returns:
+        (score, reasons) - score is 0.0 when the device isn't persistent
+    """
+    reasons = []
+    
+    # Need at least 3 appearances to be suspicious
+    if appearance_count < 3:
+        return 0.0, reasons
+    
+    # Calculate time span device was active
+    time_span_hours = (last_seen - first_seen) / 3600
+    
+    # Skip devices that only appeared briefly
+    if time_span_hours < 1.0:
+        return 0.0, reasons
+    
+    # Simple scoring: more appearances over longer time = more suspicious
+    appearance_rate = appearance_count / time_span_hours
+    
+    # Calculate score based on how persistently it appeared
+    if appearance_rate >= 0.5:  # Appeared at least every 2 hours
+        score = min(appearance_rate / 2.0, 1.0)  # Cap at 1.0
+        reasons.append(f"Appeared {appearance_count} times over {time_span_hours:.1f} hours")
+        
+        # Bonus if seen across multiple locations
+        if location_count > 1:
+            reasons.append(f"Followed across {location_count} different locations")
+            score = min(score + 0.3, 1.0)
+        
+        return score, reasons
+    
+    return 0.0, reasons
+
+def persistence_score_bound(appearance_count: int, first_seen: float, last_seen: float,
+                            location_count: int) -> float:
+    """Upper bound on calculate_persistence_score() without building its reasons"""
+    time_span_hours = (last_seen - first_seen) / 3600
+    if appearance_count < 3 or time_span_hours < 1.0:
+        return 0.0
+    appearance_rate = appearance_count / time_span_hours
+    if appearance_rate < 0.5:
+        return 0.0
+    return min(appearance_rate / 2.0, 1.0) + (0.3 if location_count > 1 else 0.0)
+
+def _score_band_end(devices: List['SuspiciousDevice'], floor: float, start: int = 0,
+                    inclusive: bool = False) -> int:
+    """
+    End of a persistence band in devices sorted by descending score
+    
+    Args:
+        floor: Band's lowest score, itself included when inclusive
+        start: Index the band starts at
+    
+    Returns:
+        Index of the first device at or after start scoring below the band
+    """
+    end = len(devices)
+    while start < end:
+        middle = (start + end) // 2
+        score = devices[middle].persistence_score
+        if score > floor or (inclusive and score == floor):
+            start = middle + 1
+        else:
+            end = middle
+    return start
+
 @dataclass
 class SuspiciousDevice:
     """Device flagged as potentially suspicious"""
@@ -35,13 +328,276 @@ class SuspiciousDevice:
     total_appearances: int
     locations_seen: List[str]
 
+# Detailed per-device section of the surveillance report, filled with format_map()
+DEVICE_ANALYSIS_TEMPLATE = """\
+#### {emoji} Device Analysis: `{mac}`
+
+*A MAC address is like a unique fingerprint for each wireless device (phone, laptop, etc.)*
+
+**📊 Persistence Analysis:**
+- **Pattern Type:** {persistence_level} FREQUENCY
+- **Persistence Score:** {score:.3f}/1.000 *(Higher = More Suspicious)*
+- **Confidence:** {confidence:.1f}% *(How sure we are this is suspicious)*
+- **Pattern Analysis:** {pattern_analysis}
+
+**⏰ Time-Based Behavior Analysis:**
+*This shows how long the device has been appearing and how often*
+
+- **Total Surveillance Period:** {duration_hours:.1f} hours ({duration_days} days)
+- **First Time Spotted:** {first_seen}
+- **Most Recent Sighting:** {last_seen}
+- **Total Appearances:** {total_appearances} times
+- **How Often It Appears:** {rate:.2f} times per hour
+
+  📊 **Analysis:** {frequency_analysis}
+
+**🗺️ Location Tracking Analysis:**
+*This shows whether the device follows you to different places*
+
+- **Different Locations Seen:** {location_count}
+- **Specific Locations:** {locations}
+- **Following Behavior:** {following_behavior}
+
+**Behavioral Threat Indicators:**
+{reasons}
+**Recent Activity Timeline:**
+{timeline}
+**General Recommendations:**
+- 📊 **Data Analysis**: This device showed repeated appearances in your wireless environment
+- 🔍 **Consider**: This pattern might be worth noting or monitoring
+- 📝 **Documentation**: You could keep a log of when/where this device appears
+- 🤔 **Context**: Remember this could be a neighbor, business device, or normal wireless traffic
+- ⚖️ **Disclaimer**: These are statistical patterns only - not definitive proof of surveillance
+
+---
+"""
+
+# Static sections of the surveillance report. Each is appended as one pre-joined
+# block so building the report only formats the parts that change.
+
+# Opening explanation of what the report covers
+REPORT_INTRO = """\
+# 🛡️ SURVEILLANCE DETECTION ANALYSIS
+## Personal Safety & Privacy Report
+
+### 📖 What This Report Does
+
+This analysis examines wireless devices around you to detect potential surveillance or stalking. Here's how it works:
+
+**🔍 What We Monitor:**
+- Wireless devices (phones, laptops, tracking devices) that appear near you
+- Whether the same devices show up repeatedly or follow you to different locations
+- Unusual patterns that might indicate someone is tracking your movements
+
+**🎯 What We Look For:**
+- **Persistence:** Devices that keep appearing over time
+- **Following:** Devices that show up at your home, work, and other locations
+- **Suspicious Timing:** Devices active during unusual hours or at regular intervals
+- **Tracking Behavior:** Patterns that suggest intentional surveillance
+
+**✅ Your Safety:** If no persistent_devices are found, your wireless environment appears normal and safe.
+**⚠️ Threats Detected:** If suspicious devices are identified, we'll explain exactly what's concerning and what you should do.
+
+---
+
+## 📊 ANALYSIS SUMMARY"""
+
+# Heading and column titles of the analytics dashboard table
+REPORT_DASHBOARD_HEADER = """\
+## 📊 SURVEILLANCE ANALYTICS DASHBOARD
+
+*This dashboard analyzes your wireless environment for suspicious patterns that could indicate surveillance or stalking.*
+
+| Metric | Value | Risk Indicator | What This Means |
+|--------|-------|----------------|-----------------|"""
+
+# Plain-language explanation of the dashboard metrics
+REPORT_METRICS_EXPLAINED = """\
+### 🤔 What Do These Numbers Mean?
+
+**Device Persistence Rate:** In a normal environment, most devices (phones, laptops) appear briefly and then leave. If many devices keep appearing repeatedly, it could indicate:
+- Someone might be deliberately staying near your location
+- Surveillance equipment could potentially be planted nearby
+- *Normal range: Under 15% | Concerning: Over 30%*
+
+**Multi-Location Tracking:** This is often considered the most serious indicator. If the same devices appear at your home, work, and other locations, it might suggest:
+- Someone could be following you
+- Stalking or surveillance could potentially be occurring
+- *Normal range: Under 10% | Critical: Over 20%*
+
+**Analysis Time Period:** Shows how long your monitoring covered. Longer periods provide more reliable results:
+- Short periods (under 6 hours) might miss patterns
+- Longer periods (over 12 hours) give comprehensive coverage
+- *Recommended: At least 12+ hours | Optimal: 24+ hours*
+
+**Data Quality Score:** Indicates how reliable the analysis results are based on:
+- Completeness of the wireless data collected
+- GPS accuracy and location correlation quality
+- *Excellent: 90%+ | Good: 80-89% | Poor: Under 80%*
+"""
+
+# Persistence scoring explanation, shown when devices were flagged
+REPORT_SCORING_EXPLAINED = """\
+## 📊 PERSISTENT DEVICE ANALYSIS
+
+*The following devices showed repeated wireless activity patterns in your environment.*
+
+### 🎯 How Persistence Scores Work
+
+Each device gets a **Persistence Score** from 0.0 to 1.0 based on suspicious behaviors:
+
+**🟢 Normal (0.0-0.5):** Typical behavior - device appears briefly, doesn't follow you
+**🟡 Suspicious (0.6-0.7):** Some concerning patterns - appears multiple times or locations
+**⚠️ High Threat (0.8-0.9):** Strong surveillance indicators - follows you, appears regularly
+**🚨 Critical (0.9-1.0):** Almost certain surveillance - tracks you across locations with suspicious timing
+
+**What Makes a Device Suspicious:**
+- **Appears repeatedly** at the same location over hours/days
+- **Follows you** to different locations (home, work, store)
+- **Regular timing** - shows up at predictable times
+- **Night activity** - appears during unusual hours
+- **Suspicious scanning** - searches for networks with concerning names
+"""
+
+# Opening of the countermeasures section
+REPORT_COUNTERMEASURES_HEADER = """\
+## 🛡️ SECURITY COUNTERMEASURES & PROTECTION GUIDE
+
+*Based on your analysis results, here are specific actions you can take to protect yourself.*
+"""
+
+# Privacy tips shown when high-persistence devices were found
+REPORT_HIGH_PERSISTENCE_TIPS = """\
+### 📊 HIGH-PERSISTENCE DEVICES DETECTED
+**ℹ️ Some devices showed high-frequency appearances - here are some general privacy tips:**
+
+#### 1. 📱 Consider Protecting Your Devices
+**MAC Address Randomization** *(Could make your devices harder to track)*:
+- **iPhone/iPad:** Settings → Wi-Fi → Tap info (i) next to network → Consider enabling 'Private Address'
+- **Android:** Settings → Wi-Fi → Advanced → Consider enabling 'Use randomized MAC'
+- **Windows:** Settings → Network & Internet → Wi-Fi → Manage known networks → Properties → Consider enabling 'Use random hardware addresses'
+- **Mac:** System Preferences → Network → Wi-Fi → Advanced → Consider enabling 'Use private Wi-Fi address'
+
+**When You Might Consider Disabling Wi-Fi:**
+- You could turn off Wi-Fi when walking around in public
+- You might use cellular data instead when you suspect someone is following
+- You could consider a Faraday bag (signal-blocking pouch) for your phone in high-risk situations
+
+#### 2. 🚶 Consider Changing Your Patterns
+**You Might Consider Varying Your Routines:**
+- You could take different routes to work/home each day
+- You might change the times you leave and arrive
+- You could visit different stores/restaurants than usual
+- If possible, you might consider staying with friends/family temporarily
+
+**Why This Could Help:** Surveillance often relies on predictable patterns. By changing your routine, you could potentially make it harder for someone to track you.
+
+#### 3. 📞 Consider Getting Help
+**You Might Consider Documenting Everything:**
+- You could save this report with timestamps
+- You might take photos of suspicious people or vehicles
+- You could keep a log of when/where you notice anything unusual
+
+**Contacting Authorities (Your Choice):**
+- **If you feel in immediate danger:** You could call 911
+- **For stalking/harassment:** You might contact local police non-emergency line
+- **For cybersecurity help:** You could consider consulting a security professional
+- **Legal protection:** You might research restraining orders if you know who's involved
+"""
+
+# Long-term privacy advice included in every report
+REPORT_LONG_TERM_PROTECTION = """\
+### 🔒 LONG-TERM PRIVACY PROTECTION
+*These steps help protect you from future surveillance attempts.*
+
+#### 📱 Consider Making Your Devices More Private
+**Wi-Fi Settings You Might Consider:**
+- You could enable MAC address randomization on your devices
+- You might remove old Wi-Fi networks you don't use anymore
+- You could turn off 'Auto-join' for public Wi-Fi networks
+- You might use a trusted VPN service when on public Wi-Fi
+
+#### 🚶 Consider Staying Unpredictable
+**Daily Habits You Might Consider:**
+- You could vary your daily routes when possible
+- You might be aware of people or cars you see repeatedly
+- You could trust your instincts - if something feels wrong, it might be
+- You might consider learning counter-surveillance techniques
+
+#### 🔍 Consider Continued Monitoring
+**Using This Tool:**
+- You could run CYT analysis regularly if you're concerned about surveillance
+- You might pay attention to devices that appear in multiple locations
+- You could share reports with law enforcement if patterns emerge
+- You might keep logs of any suspicious activity
+
+#### ℹ️ Understanding the Technology
+**How Surveillance Tracking Works:**
+- Devices broadcast unique identifiers (MAC addresses) when searching for Wi-Fi networks
+- **Modern phones (iOS 14+, Android 10+) randomize these addresses** to protect privacy
+- **Older devices or those with randomization disabled** still reveal their true MAC address
+- Surveillance equipment could record these identifiers to track device movements
+- This tool detects patterns where the same identifiers appear repeatedly or across locations
+- **Note:** Randomized MAC addresses make tracking much harder but don't eliminate all risks
+"""
+
+# Footer text ahead of the report ID
+REPORT_FOOTER = """\
+---
+
+*This report was generated by the CYT Advanced Surveillance Detection System.*
+*For technical support or threat intelligence inquiries, contact your security administrator.*
+"""
+
+# Styling for the HTML version of the report, placed in the page header as-is
+REPORT_HTML_STYLE = """\
+<style>
+body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif; 
+       max-width: 1200px; margin: 0 auto; padding: 20px; line-height: 1.6; }
+h1, h2, h3 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
+table { border-collapse: collapse; width: 100%; margin: 20px 0; }
+th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
+th { background-color: #f8f9fa; font-weight: bold; }
+.emoji { font-size: 1.2em; }
+code { background-color: #f1f2f6; padding: 4px 8px; border-radius: 4px; }
+pre { background-color: #f8f9fa; padding: 15px; border-radius: 8px; overflow-x: auto; }
+blockquote { border-left: 4px solid #3498db; padding-left: 20px; margin-left: 0; 
+            background-color: #f8f9fa; padding: 15px 20px; border-radius: 0 8px 8px 0; }
+.threat-high { background-color: #ffe6e6; border-left: 4px solid #e74c3c; }
+.threat-medium { background-color: #fff3cd; border-left: 4px solid #f39c12; }
+.threat-low { background-color: #d4edda; border-left: 4px solid #27ae60; }
+</style>
+"""
+
 class SurveillanceDetector:
     """Detect potential surveillance devices"""
     
+    # Fixed wording of the detailed device analysis, chosen per device
+    THREAT_EMOJI = {"CRITICAL": "🚨", "HIGH": "⚠️", "MEDIUM": "🟡", "LOW": "🔵"}
+    PATTERN_ANALYSIS = {
+        'CRITICAL': '📊 High-frequency appearance pattern',
+        'HIGH': '📈 Notable appearance pattern',
+    }
+    FREQUENCY_ANALYSIS = {
+        'very_frequent': "This device appears very frequently, which is unusual for normal devices.",
+        'regular': "This device appears regularly, worth monitoring.",
+        'low': "Low appearance count, may not be actively tracking.",
+    }
+    FOLLOWING_BEHAVIOR = {
+        True: ("✅ **CONFIRMED** - This device has appeared at multiple locations\n"
+               "  🚨 **This is a major red flag - normal devices don't follow you around!**"),
+        False: ("❌ Only seen at one location\n"
+                "  ℹ️ **This could be a local device, but monitor for movement**"),
+    }
+    
     def __init__(self, config: Dict):
         self.config = config
-        self.appearances = []
-        self.device_history = defaultdict(list)
+        self._reset_history()
+        
+        # Optional bound on the history kept by long-running sessions; appearances
+        # older than this relative to the newest one are dropped (None keeps everything)
+        window_hours = config.get('timing', {}).get('history_window_hours')
+        self.history_window_seconds = window_hours * 3600 if window_hours else None
         
         # Simple detection thresholds
         self.thresholds = {
@@ -50,44 +606,190 @@ class SurveillanceDetector:
             'min_persistence_score': 0.5    # Minimum score to be flagged
         }
     
+    def _reset_history(self) -> None:
+        """Start with no recorded appearances"""
+        self._histories = {}
+        self._appearance_count = 0
+        
+        # Per-device and session-wide aggregates, kept current on every appearance
+        # so statistics don't rescan the full history
+        self._device_stats = defaultdict(DeviceStats)
+        self._locations = set()
+        self._first_timestamp = None
+        self._last_timestamp = None
+        
+        # DeviceFeatures by MAC, dropped whenever the device gets a new appearance
+        self._device_features = {}
+    
     def add_device_appearance(self, mac: str, timestamp: float, location_id: str, 
                             ssids_probed: List[str] = None, signal_strength: float = None,
                             device_type: str = None) -> None:
         """Record a device appearance"""
-        appearance = DeviceAppearance(
-            mac=mac,
-            timestamp=timestamp,
-            location_id=location_id,
-            ssids_probed=ssids_probed or [],
-            signal_strength=signal_strength,
-            device_type=device_type
-        )
-        
-        self.appearances.append(appearance)
-        self.device_history[mac].append(appearance)
-        
-        logger.debug(f"Recorded appearance: {mac} at {location_id}")
+        mac = intern(mac)
+        location_id = intern(location_id)
+        ssids_probed = ssids_probed or ()
+        
+        history = self._histories.get(mac)
+        if history is None:
+            history = self._histories[mac] = DeviceHistory(mac)
+        history.append(timestamp, location_id, ssids_probed, signal_strength, device_type)
+        self._appearance_count += 1
+        self._device_stats[mac].add(timestamp, location_id, ssids_probed)
+        self._device_features.pop(mac, None)
+        self._update_session_span(timestamp, timestamp)
+        self._locations.add(location_id)
+        
+        logger.debug("Recorded appearance: %s at %s", mac, location_id)
+        self._expire_old_appearances()
+    
+    def add_device_appearances(self, appearances: Iterable[tuple], location_id: str) -> int:
+        """
+        Record many appearances at one location in a single call
+        
+        Args:
+            appearances: (mac, timestamp, ssids_probed, device_type) tuples
+            location_id: Location shared by every appearance
+        
+        Returns:
+            Number of appearances recorded
+        """
+        # Interned so every appearance of a device shares one MAC string and
+        # history lookups hit the identity fast path
+        location_id = intern(location_id)
+        histories = self._histories
+        device_stats = self._device_stats
+        device_features = self._device_features
+        recorded = 0
+        first = last = None
+        for mac, timestamp, ssids_probed, device_type in appearances:
+            mac = intern(mac)
+            ssids_probed = ssids_probed or ()
+            history = histories.get(mac)
+            if history is None:
+                history = histories[mac] = DeviceHistory(mac)
+            history.append(timestamp, location_id, ssids_probed, None, device_type and intern(device_type))
+            device_stats[mac].add(timestamp, location_id, ssids_probed)
+            device_features.pop(mac, None)
+            
+            recorded += 1
+            if first is None or timestamp < first:
+                first = timestamp
+            if last is None or timestamp > last:
+                last = timestamp
+        
+        if not recorded:
+            return 0
+        
+        self._appearance_count += recorded
+        self._update_session_span(first, last)
+        self._locations.add(location_id)
+        
+        logger.debug("Recorded %d appearances at %s", recorded, location_id)
+        self._expire_old_appearances()
+        return recorded
+    
+    def _expire_old_appearances(self) -> None:
+        """Drop appearances that fell out of the history window, if one is set"""
+        window = self.history_window_seconds
+        if not window or self._first_timestamp is None:
+            return
+        
+        # Expiring rebuilds the affected devices' aggregates, so wait until a
+        # tenth of the window has aged out rather than doing it on every appearance
+        cutoff = self._last_timestamp - window
+        if cutoff - self._first_timestamp < window / 10:
+            return
+        
+        expired = 0
+        for mac, history in list(self._histories.items()):
+            dropped = history.retain_since(cutoff)
+            if not dropped:
+                continue
+            expired += dropped
+            self._device_features.pop(mac, None)
+            if not history:
+                del self._histories[mac]
+                del self._device_stats[mac]
+                continue
+            stats = self._device_stats[mac] = DeviceStats()
+            for timestamp, location_id, ssids_probed in zip(
+                    history.timestamps, history.location_ids, history.ssids_probed):
+                stats.add(timestamp, location_id, ssids_probed)
+        self._appearance_count -= expired
+        
+        self._locations = set()
+        self._first_timestamp = None
+        self._last_timestamp = None
+        for stats in self._device_stats.values():
+            self._locations |= stats.locations
+            self._update_session_span(stats.first_seen, stats.last_seen)
+        
+        logger.debug("Expired %d appearances older than %.1f hours", expired, window / 3600)
+    
+    @property
+    def device_history(self) -> Dict[str, List[DeviceAppearance]]:
+        """Every device's appearances by MAC, materialized as DeviceAppearance objects"""
+        return {mac: history.appearances() for mac, history in self._histories.items()}
+    
+    @property
+    def appearances(self) -> List[DeviceAppearance]:
+        """Every recorded appearance, grouped by device"""
+        return [appearance for history in self._histories.values() for appearance in history.appearances()]
+    
+    def _update_session_span(self, first: float, last: float) -> None:
+        """Widen the session's first/last timestamps to cover [first, last]"""
+        if self._first_timestamp is None or first < self._first_timestamp:
+            self._first_timestamp = first
+        if self._last_timestamp is None or last > self._last_timestamp:
+            self._last_timestamp = last
+    
+    def _features(self, mac: str) -> DeviceFeatures:
+        """Derived features for a device, rebuilt only after it has new appearances"""
+        features = self._device_features.get(mac)
+        if features is None:
+            appearances = sorted(self._histories[mac].appearances(), key=lambda a: a.timestamp)
+            timestamps = [a.timestamp for a in appearances]
+            local_times = [local_hour_weekday(timestamp) for timestamp in timestamps]
+            features = DeviceFeatures(
+                appearances=appearances,
+                timestamps=timestamps,
+                hours=[hour for hour, _ in local_times],
+                weekdays=[weekday for _, weekday in local_times]
+            )
+            self._device_features[mac] = features
+        return features
     
     def analyze_surveillance_patterns(self) -> List[SuspiciousDevice]:
         """Analyze all devices for surveillance patterns"""
         suspicious_devices = []
+        min_appearances = self.thresholds['min_appearances']
+        min_persistence_score = self.thresholds['min_persistence_score']
+        histories = self._histories
         
-        for mac, appearances in self.device_history.items():
-            if len(appearances) < self.thresholds['min_appearances']:
+        # Score straight from the aggregates; only flagged devices touch their history
+        for mac, stats in self._device_stats.items():
+            if stats.count < min_appearances:
+                continue
+            
+            # Most devices can't reach the threshold; skip them before formatting reasons
+            if persistence_score_bound(stats.count, stats.first_seen, stats.last_seen,
+                                       len(stats.locations)) <= min_persistence_score:
                 continue
-                
-            persistence_score, reasons = self._calculate_persistence_score(appearances)
             
-            if persistence_score > self.thresholds['min_persistence_score']:  # Persistence threshold
+            persistence_score, reasons = calculate_persistence_score(
+                stats.count, stats.first_seen, stats.last_seen, len(stats.locations))
+            
+            if persistence_score > min_persistence_score:  # Persistence threshold
+                appearances = histories[mac].appearances()
                 suspicious_device = SuspiciousDevice(
                     mac=mac,
                     persistence_score=persistence_score,
                     appearances=appearances,
                     reasons=reasons,
-                    first_seen=datetime.fromtimestamp(min(a.timestamp for a in appearances)),
-                    last_seen=datetime.fromtimestamp(max(a.timestamp for a in appearances)),
-                    total_appearances=len(appearances),
-                    locations_seen=list(set(a.location_id for a in appearances))
+                    first_seen=datetime.fromtimestamp(stats.first_seen),
+                    last_seen=datetime.fromtimestamp(stats.last_seen),
+                    total_appearances=stats.count,
+                    locations_seen=list(stats.locations)
                 )
                 suspicious_devices.append(suspicious_device)
         
@@ -95,47 +797,13 @@ class SurveillanceDetector:
         suspicious_devices.sort(key=lambda d: d.persistence_score, reverse=True)
         return suspicious_devices
     
-    def _calculate_persistence_score(self, appearances: List[DeviceAppearance]) -> Tuple[float, List[str]]:
-        """Simple persistence scoring: just detect devices that appear frequently over time"""
-        reasons = []
-        
-        # Need at least 3 appearances to be suspicious
-        if len(appearances) < 3:
-            return 0.0, reasons
-        
-        # Calculate time span device was active
-        timestamps = [a.timestamp for a in appearances]
-        time_span_hours = (max(timestamps) - min(timestamps)) / 3600
-        
-        # Skip devices that only appeared briefly
-        if time_span_hours < 1.0:
-            return 0.0, reasons
-        
-        # Simple scoring: more appearances over longer time = more suspicious
-        appearance_rate = len(appearances) / time_span_hours
-        
-        # Calculate score based on how persistently it appeared
-        if appearance_rate >= 0.5:  # Appeared at least every 2 hours
-            score = min(appearance_rate / 2.0, 1.0)  # Cap at 1.0
-            reasons.append(f"Appeared {len(appearances)} times over {time_span_hours:.1f} hours")
-            
-            # Bonus if seen across multiple locations
-            unique_locations = len(set(a.location_id for a in appearances))
-            if unique_locations > 1:
-                reasons.append(f"Followed across {unique_locations} different locations")
-                score = min(score + 0.3, 1.0)
-            
-            return score, reasons
-        
-        return 0.0, reasons
-    
     
     
     
     
     def _generate_analysis_statistics(self) -> Dict:
         """Generate comprehensive statistics for the analysis"""
-        if not self.appearances:
+        if not self._appearance_count:
             return {
                 'total_appearances': 0,
                 'unique_devices': 0,
@@ -150,64 +818,46 @@ class SurveillanceDetector:
             }
         
         # Basic metrics
-        total_appearances = len(self.appearances)
-        unique_devices = len(self.device_history)
-        unique_locations = len(set(a.location_id for a in self.appearances))
+        total_appearances = self._appearance_count
+        unique_devices = len(self._device_stats)
+        unique_locations = len(self._locations)
+        min_appearances = self.thresholds['min_appearances']
         
-        # Time analysis
-        timestamps = [a.timestamp for a in self.appearances]
-        analysis_duration = max(timestamps) - min(timestamps)
-        analysis_duration_hours = analysis_duration / 3600 if analysis_duration > 0 else 0
-        
-        # Device persistence analysis
-        persistent_devices = [mac for mac, appearances in self.device_history.items() 
-                            if len(appearances) >= self.thresholds['min_appearances']]
-        persistence_rate = len(persistent_devices) / unique_devices if unique_devices > 0 else 0
-        
-        # Multi-location tracking analysis
+        # Everything below reads the running per-device aggregates
+        persistent_devices = 0
         multi_location_devices = 0
-        for mac, appearances in self.device_history.items():
-            locations = set(a.location_id for a in appearances)
-            if len(locations) >= 2:  # 2+ locations indicates following
-                multi_location_devices += 1
-        multi_location_rate = multi_location_devices / unique_devices if unique_devices > 0 else 0
-        
-        # Temporal clustering analysis
         clustered_devices = 0
-        for mac, appearances in self.device_history.items():
-            if len(appearances) >= 3:
-                times = sorted([a.timestamp for a in appearances])
-                intervals = [times[i] - times[i-1] for i in range(1, len(times))]
-                if intervals:
-                    avg_interval = sum(intervals) / len(intervals)
-                    variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
-                    if variance < 3600:  # Low variance = clustered timing
-                        clustered_devices += 1
-        temporal_clustering = clustered_devices / unique_devices if unique_devices > 0 else 0
-        
-        # Off-hours activity analysis
         off_hours_appearances = 0
-        for appearance in self.appearances:
-            hour = datetime.fromtimestamp(appearance.timestamp).hour
-            if hour >= 22 or hour <= 6:  # 10 PM to 6 AM
-                off_hours_appearances += 1
-        off_hours_rate = off_hours_appearances / total_appearances if total_appearances > 0 else 0
-        
-        # Probe pattern anomaly analysis
         anomalous_devices = 0
-        suspicious_patterns = ['surveillance', 'monitor', 'track', 'spy', 'watch', 'police', 'fbi']
-        for mac, appearances in self.device_history.items():
-            all_ssids = []
-            for appearance in appearances:
-                all_ssids.extend(appearance.ssids_probed)
+        for mac, stats in self._device_stats.items():
+            # Device persistence
+            if stats.count >= min_appearances:
+                persistent_devices += 1
+            
+            # Multi-location tracking: 2+ locations indicates following
+            if len(stats.locations) >= 2:
+                multi_location_devices += 1
+            
+            # Temporal clustering: low interval variance = clustered timing
+            if stats.count >= 3:
+                variance = stats.interval_variance()
+                if variance is None:
+                    variance = _interval_stats(sorted(self._histories[mac].timestamps))[1]
+                if variance < 3600:
+                    clustered_devices += 1
             
-            unique_ssids = len(set(all_ssids))
-            suspicious_count = sum(1 for ssid in set(all_ssids) 
-                                 if any(pattern in ssid.lower() for pattern in suspicious_patterns))
+            off_hours_appearances += stats.off_hours
             
-            if unique_ssids > 20 or suspicious_count > 0:
+            # Probe pattern anomalies
+            if len(stats.ssids) > 20 or stats.suspicious_ssids > 0:
                 anomalous_devices += 1
         
+        analysis_duration = self._last_timestamp - self._first_timestamp
+        analysis_duration_hours = analysis_duration / 3600 if analysis_duration > 0 else 0
+        persistence_rate = persistent_devices / unique_devices if unique_devices > 0 else 0
+        multi_location_rate = multi_location_devices / unique_devices if unique_devices > 0 else 0
+        temporal_clustering = clustered_devices / unique_devices if unique_devices > 0 else 0
+        off_hours_rate = off_hours_appearances / total_appearances if total_appearances > 0 else 0
         probe_anomaly_rate = anomalous_devices / unique_devices if unique_devices > 0 else 0
         
         return {
@@ -225,87 +875,47 @@ class SurveillanceDetector:
     
     def _format_detailed_device_analysis(self, device: SuspiciousDevice, persistence_level: str) -> str:
         """Format detailed analysis for a suspicious device with clear explanations"""
-        lines = []
-        
-        # Device header
-        threat_emoji = {"CRITICAL": "🚨", "HIGH": "⚠️", "MEDIUM": "🟡", "LOW": "🔵"}
-        emoji = threat_emoji.get(persistence_level, "⚪")
-        
-        lines.append(f"#### {emoji} Device Analysis: `{device.mac}`")
-        lines.append("")
-        lines.append("*A MAC address is like a unique fingerprint for each wireless device (phone, laptop, etc.)*")
-        lines.append("")
-        lines.append("**📊 Persistence Analysis:**")
-        lines.append(f"- **Pattern Type:** {persistence_level} FREQUENCY")
-        lines.append(f"- **Persistence Score:** {device.persistence_score:.3f}/1.000 *(Higher = More Suspicious)*")
-        lines.append(f"- **Confidence:** {min(device.persistence_score * 100, 95):.1f}% *(How sure we are this is suspicious)*")
-        lines.append(f"- **Pattern Analysis:** {'📊 High-frequency appearance pattern' if persistence_level == 'CRITICAL' else '📈 Notable appearance pattern' if persistence_level == 'HIGH' else '📋 Low-frequency pattern'}")
-        lines.append("")
-        
-        # Temporal analysis with explanations
         duration = device.last_seen - device.first_seen
         duration_hours = duration.total_seconds() / 3600
-        lines.append("**⏰ Time-Based Behavior Analysis:**")
-        lines.append("*This shows how long the device has been appearing and how often*")
-        lines.append("")
-        lines.append(f"- **Total Surveillance Period:** {duration_hours:.1f} hours ({duration.days} days)")
-        lines.append(f"- **First Time Spotted:** {device.first_seen.strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"- **Most Recent Sighting:** {device.last_seen.strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"- **Total Appearances:** {device.total_appearances} times")
-        lines.append(f"- **How Often It Appears:** {device.total_appearances / max(duration_hours, 1):.2f} times per hour")
-        lines.append("")
+        
         if device.total_appearances > 10:
-            lines.append("  📊 **Analysis:** This device appears very frequently, which is unusual for normal devices.")
+            frequency_analysis = self.FREQUENCY_ANALYSIS['very_frequent']
         elif device.total_appearances > 5:
-            lines.append("  📊 **Analysis:** This device appears regularly, worth monitoring.")
-        else:
-            lines.append("  📊 **Analysis:** Low appearance count, may not be actively tracking.")
-        lines.append("")
-        
-        # Geographic analysis with explanations
-        lines.append("**🗺️ Location Tracking Analysis:**")
-        lines.append("*This shows whether the device follows you to different places*")
-        lines.append("")
-        lines.append(f"- **Different Locations Seen:** {len(device.locations_seen)}")
-        lines.append(f"- **Specific Locations:** {', '.join(device.locations_seen)}")
-        if len(device.locations_seen) > 1:
-            lines.append(f"- **Following Behavior:** ✅ **CONFIRMED** - This device has appeared at multiple locations")
-            lines.append("  🚨 **This is a major red flag - normal devices don't follow you around!**")
+            frequency_analysis = self.FREQUENCY_ANALYSIS['regular']
         else:
-            lines.append(f"- **Following Behavior:** ❌ Only seen at one location")
-            lines.append("  ℹ️ **This could be a local device, but monitor for movement**")
-        lines.append("")
-        
-        # Behavioral indicators
-        lines.append("**Behavioral Threat Indicators:**")
-        for i, reason in enumerate(device.reasons, 1):
-            lines.append(f"  {i}. {reason}")
-        lines.append("")
-        
-        # Activity timeline (enhanced)
-        lines.append("**Recent Activity Timeline:**")
-        recent_appearances = sorted(device.appearances, key=lambda a: a.timestamp, reverse=True)[:10]
-        for appearance in recent_appearances:
+            frequency_analysis = self.FREQUENCY_ANALYSIS['low']
+        
+        # Variable-length blocks carry their own line endings so an empty one adds no blank line
+        reasons = ''.join(f"  {i}. {reason}\n" for i, reason in enumerate(device.reasons, 1))
+        
+        timeline = []
+        for appearance in heapq.nlargest(10, device.appearances, key=lambda a: a.timestamp):
             dt = datetime.fromtimestamp(appearance.timestamp)
             ssids = ', '.join(appearance.ssids_probed[:2]) if appearance.ssids_probed else 'No probes'
-            lines.append(f"- `{dt.strftime('%Y-%m-%d %H:%M:%S')}` | Location: `{appearance.location_id}` | SSIDs: {ssids}")
-        
+            timeline.append(f"- `{dt.strftime('%Y-%m-%d %H:%M:%S')}` | Location: `{appearance.location_id}` | SSIDs: {ssids}\n")
         if len(device.appearances) > 10:
-            lines.append(f"- *... and {len(device.appearances) - 10} additional appearances*")
-        lines.append("")
-        
-        # General recommendations (liability-safe)
-        lines.append("**General Recommendations:**")
-        lines.append("- 📊 **Data Analysis**: This device showed repeated appearances in your wireless environment")
-        lines.append("- 🔍 **Consider**: This pattern might be worth noting or monitoring")
-        lines.append("- 📝 **Documentation**: You could keep a log of when/where this device appears")
-        lines.append("- 🤔 **Context**: Remember this could be a neighbor, business device, or normal wireless traffic")
-        lines.append("- ⚖️ **Disclaimer**: These are statistical patterns only - not definitive proof of surveillance")
-        lines.append("")
-        lines.append("---")
-        lines.append("")
-        
-        return '\n'.join(lines)
+            timeline.append(f"- *... and {len(device.appearances) - 10} additional appearances*\n")
+        
+        return DEVICE_ANALYSIS_TEMPLATE.format_map({
+            'emoji': self.THREAT_EMOJI.get(persistence_level, "⚪"),
+            'mac': device.mac,
+            'persistence_level': persistence_level,
+            'score': device.persistence_score,
+            'confidence': min(device.persistence_score * 100, 95),
+            'pattern_analysis': self.PATTERN_ANALYSIS.get(persistence_level, '📋 Low-frequency pattern'),
+            'duration_hours': duration_hours,
+            'duration_days': duration.days,
+            'first_seen': device.first_seen.strftime('%Y-%m-%d %H:%M:%S'),
+            'last_seen': device.last_seen.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_appearances': device.total_appearances,
+            'rate': device.total_appearances / max(duration_hours, 1),
+            'frequency_analysis': frequency_analysis,
+            'location_count': len(device.locations_seen),
+            'locations': ', '.join(device.locations_seen),
+            'following_behavior': self.FOLLOWING_BEHAVIOR[len(device.locations_seen) > 1],
+            'reasons': reasons,
+            'timeline': ''.join(timeline),
+        })
     
     def _analyze_temporal_patterns(self, suspicious_devices: List[SuspiciousDevice]) -> List[str]:
         """Analyze temporal patterns across suspicious devices"""
@@ -320,12 +930,13 @@ class SurveillanceDetector:
         regular_interval_devices = 0
         
         for device in suspicious_devices:
-            hours = [datetime.fromtimestamp(a.timestamp).hour for a in device.appearances]
-            work_hours = [h for h in hours if 9 <= h <= 17]
-            off_hours = [h for h in hours if h >= 22 or h <= 6]
+            features = self._features(device.mac)
+            hours = features.hours
+            work_hours = sum((WORK_HOURS_MASK >> h) & 1 for h in hours)
+            off_hours = sum((OFF_HOURS_MASK >> h) & 1 for h in hours)
             
-            work_hour_ratio = len(work_hours) / len(hours) if hours else 0
-            off_hour_ratio = len(off_hours) / len(hours) if hours else 0
+            work_hour_ratio = work_hours / len(hours) if hours else 0
+            off_hour_ratio = off_hours / len(hours) if hours else 0
             
             if work_hour_ratio > 0.7:
                 work_hour_devices += 1
@@ -333,14 +944,11 @@ class SurveillanceDetector:
                 off_hour_devices += 1
             
             # Check for regular intervals
-            if len(device.appearances) >= 3:
-                timestamps = sorted([a.timestamp for a in device.appearances])
-                intervals = [timestamps[i] - timestamps[i-1] for i in range(1, len(timestamps))]
-                if len(intervals) > 1:
-                    avg_interval = sum(intervals) / len(intervals)
-                    variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
-                    if variance < (avg_interval * 0.1):  # Low variance = regular
-                        regular_interval_devices += 1
+            timestamps = features.timestamps
+            if len(timestamps) >= 3:
+                avg_interval, variance = _interval_stats(timestamps)
+                if variance < (avg_interval * 0.1):  # Low variance = regular
+                    regular_interval_devices += 1
         
         if work_hour_devices > 0:
             patterns.append(f"**{work_hour_devices} devices** show work-hours-only activity (9 AM - 5 PM) - possible workplace surveillance")
@@ -355,18 +963,13 @@ class SurveillanceDetector:
         weekday_heavy = 0
         weekend_heavy = 0
         for device in suspicious_devices:
-            weekdays = []
-            weekends = []
-            for appearance in device.appearances:
-                day_of_week = datetime.fromtimestamp(appearance.timestamp).weekday()
-                if day_of_week < 5:  # Monday = 0, Friday = 4
-                    weekdays.append(appearance)
-                else:
-                    weekends.append(appearance)
+            days = self._features(device.mac).weekdays
+            weekdays = sum((WEEKDAYS_MASK >> day) & 1 for day in days)
+            weekends = len(days) - weekdays
             
-            if len(weekdays) > len(weekends) * 2:
+            if weekdays > weekends * 2:
                 weekday_heavy += 1
-            elif len(weekends) > len(weekdays):
+            elif weekends > weekdays:
                 weekend_heavy += 1
         
         if weekday_heavy > 0:
@@ -406,7 +1009,7 @@ class SurveillanceDetector:
         quick_followers = 0
         for device in suspicious_devices:
             if len(device.appearances) > 1:
-                sorted_appearances = sorted(device.appearances, key=lambda a: a.timestamp)
+                sorted_appearances = self._features(device.mac).appearances
                 for i in range(1, len(sorted_appearances)):
                     prev_loc = sorted_appearances[i-1].location_id
                     curr_loc = sorted_appearances[i].location_id
@@ -432,74 +1035,143 @@ class SurveillanceDetector:
         if len(suspicious_devices) < 2:
             return correlations
         
-        # Find devices that appear at same times/locations
-        for i, device1 in enumerate(suspicious_devices):
-            for j, device2 in enumerate(suspicious_devices[i+1:], i+1):
-                
-                # Location correlation
+        # Each device's locations as a bitmap (one bit per distinct location),
+        # and every appearance indexed by location
+        location_bits = {}
+        location_masks = []
+        appearances_by_location = defaultdict(list)
+        for index, device in enumerate(suspicious_devices):
+            mask = 0
+            for location in device.locations_seen:
+                mask |= 1 << location_bits.setdefault(location, len(location_bits))
+            location_masks.append(mask)
+            for appearance in device.appearances:
+                appearances_by_location[appearance.location_id].append((appearance.timestamp, index))
+        
+        # Location correlation: pairs sharing more than one location, i.e. whose
+        # common bitmap has more than one bit set. Only devices seen at two or
+        # more locations can qualify, so the pairwise scan skips the rest.
+        multi_location = [(i, mask) for i, mask in enumerate(location_masks) if mask & (mask - 1)]
+        shared_locations = set()
+        for position, (i, mask) in enumerate(multi_location):
+            for j, other_mask in islice(multi_location, position + 1, None):
+                common = mask & other_mask
+                if common & (common - 1):
+                    shared_locations.add((i, j))
+        
+        # Temporal correlation (within 1 hour at the same location): sweep each
+        # location's appearances in time order, pairing every appearance with
+        # the earlier ones still inside the window
+        temporal_matches = defaultdict(int)
+        for events in appearances_by_location.values():
+            events.sort()
+            start = 0
+            for current, (timestamp, index) in enumerate(events):
+                while timestamp - events[start][0] >= 3600:
+                    start += 1
+                for earlier in range(start, current):
+                    other = events[earlier][1]
+                    if other < index:
+                        temporal_matches[(other, index)] += 1
+                    elif other > index:
+                        temporal_matches[(index, other)] += 1
+        
+        # Report pairs in the same order as comparing every pair would
+        pairs = set(shared_locations)
+        pairs.update(pair for pair, count in temporal_matches.items() if count > 2)
+        for i, j in sorted(pairs):
+            device1 = suspicious_devices[i]
+            device2 = suspicious_devices[j]
+            if (i, j) in shared_locations:
                 common_locations = set(device1.locations_seen) & set(device2.locations_seen)
-                if len(common_locations) > 1:
-                    correlations.append(f"**{device1.mac}** and **{device2.mac}** both appear at: {', '.join(common_locations)}")
-                
-                # Temporal correlation (within 1 hour)
-                temporal_matches = 0
-                for app1 in device1.appearances:
-                    for app2 in device2.appearances:
-                        time_diff = abs(app1.timestamp - app2.timestamp)
-                        if time_diff < 3600 and app1.location_id == app2.location_id:
-                            temporal_matches += 1
-                
-                if temporal_matches > 2:
-                    correlations.append(f"**{device1.mac}** and **{device2.mac}** appear together {temporal_matches} times - possible coordinated surveillance")
+                correlations.append(f"**{device1.mac}** and **{device2.mac}** both appear at: {', '.join(common_locations)}")
+            
+            if temporal_matches[(i, j)] > 2:
+                correlations.append(f"**{device1.mac}** and **{device2.mac}** appear together {temporal_matches[(i, j)]} times - possible coordinated surveillance")
         
         return correlations
     
+    def _write_html_report(self, report_bytes: bytes, html_file: str) -> None:
+        """Convert the UTF-8 markdown report to HTML with pandoc"""
+        try:
+            import subprocess
+            import tempfile
+            # Run pandoc to convert markdown to HTML. The report text goes in on
+            # stdin rather than being read back from output_file, and the style
+            # block is placed in the page header as-is, so pandoc has nothing
+            # to embed afterwards.
+            with tempfile.NamedTemporaryFile('w', suffix='.html', encoding='utf-8') as header:
+                header.write(REPORT_HTML_STYLE)
+                header.flush()
+                
+                cmd = [
+                    'pandoc',
+                    '--from', 'markdown',
+                    '-o', html_file,
+                    '--standalone',
+                    '--metadata', 'title=CYT Surveillance Detection Report',
+                    '--include-in-header', header.name
+                ]
+                
+                result = subprocess.run(cmd, input=report_bytes, capture_output=True)
+            
+            if result.returncode == 0:
+                logger.info("HTML report generated: %s", html_file)
+            else:
+                logger.warning("Failed to generate HTML report: %s", result.stderr.decode('utf-8', 'replace'))
+                
+        except Exception as e:
+            logger.warning("Could not generate HTML report: %s", e)
+    
     def generate_surveillance_report(self, output_file: str) -> str:
         """Generate comprehensive surveillance detection report with advanced analytics"""
         suspicious_devices = self.analyze_surveillance_patterns()
         
         # Generate comprehensive statistics
         stats = self._generate_analysis_statistics()
+        duration_hours = stats['analysis_duration_hours']
+        persistence_rate = stats['persistence_rate']
+        multi_location_rate = stats['multi_location_rate']
+        detection_accuracy = stats['detection_accuracy']
+        unique_locations = stats['unique_locations']
+        # Counts shown with thousands separators in more than one section
+        total_appearances = f"{stats['total_appearances']:,}"
+        unique_devices = f"{stats['unique_devices']:,}"
         
         report = []
         
+        # One clock reading for the whole report, so the header and the
+        # report ID agree
+        generated_at = datetime.now()
+        
         # Professional header with metadata
-        report.append("# 🛡️ SURVEILLANCE DETECTION ANALYSIS")
-        report.append("## Personal Safety & Privacy Report")
-        report.append("")
-        report.append("### 📖 What This Report Does")
-        report.append("")
-        report.append("This analysis examines wireless devices around you to detect potential surveillance or stalking. Here's how it works:")
-        report.append("")
-        report.append("**🔍 What We Monitor:**")
-        report.append("- Wireless devices (phones, laptops, tracking devices) that appear near you")
-        report.append("- Whether the same devices show up repeatedly or follow you to different locations")
-        report.append("- Unusual patterns that might indicate someone is tracking your movements")
-        report.append("")
-        report.append("**🎯 What We Look For:**")
-        report.append("- **Persistence:** Devices that keep appearing over time")
-        report.append("- **Following:** Devices that show up at your home, work, and other locations")
-        report.append("- **Suspicious Timing:** Devices active during unusual hours or at regular intervals")
-        report.append("- **Tracking Behavior:** Patterns that suggest intentional surveillance")
-        report.append("")
-        report.append("**✅ Your Safety:** If no persistent_devices are found, your wireless environment appears normal and safe.")
-        report.append("**⚠️ Threats Detected:** If suspicious devices are identified, we'll explain exactly what's concerning and what you should do.")
-        report.append("")
-        report.append("---")
-        report.append("")
-        report.append("## 📊 ANALYSIS SUMMARY")
-        report.append(f"**Report Generated:** {datetime.now().strftime('%A, %B %d, %Y at %H:%M:%S')}")
+        report.append(REPORT_INTRO)
+        report.append(f"**Report Generated:** {generated_at:%A, %B %d, %Y at %H:%M:%S}")
         report.append(f"**Analysis Engine:** CYT Advanced Threat Detection v2.1")
         report.append(f"**Analysis Type:** Automated Surveillance Detection")
         report.append("")
         
+        # Threat classification. suspicious_devices is sorted by descending
+        # score, so each band is a contiguous slice found by binary search.
+        # Devices scoring exactly 0.8 are listed with the high band but count
+        # as medium for the activity level.
+        critical_end = _score_band_end(suspicious_devices, 0.9)
+        high_end = _score_band_end(suspicious_devices, 0.8, critical_end)
+        high_floor_end = _score_band_end(suspicious_devices, 0.8, high_end, inclusive=True)
+        medium_end = _score_band_end(suspicious_devices, 0.6, high_floor_end, inclusive=True)
+        critical_persistent_devices = suspicious_devices[:critical_end]
+        high_persistences = suspicious_devices[critical_end:high_floor_end]
+        medium_persistent_devices = suspicious_devices[high_floor_end:medium_end]
+        low_persistent_devices = suspicious_devices[medium_end:]
+        high_persistence = suspicious_devices[:high_end]
+        
         # Threat Level Assessment
         if not suspicious_devices:
             persistence_level = "🟢 **LOW ACTIVITY**"
             threat_color = "GREEN"
         else:
-            high_persistence_count = len([d for d in suspicious_devices if d.persistence_score > 0.8])
-            medium_threat_count = len([d for d in suspicious_devices if 0.6 <= d.persistence_score <= 0.8])
+            high_persistence_count = len(high_persistence)
+            medium_threat_count = medium_end - high_end
             
             if high_persistence_count > 0:
                 persistence_level = "🔴 **HIGH ACTIVITY**"
@@ -515,79 +1187,26 @@ class SurveillanceDetector:
         report.append("")
         report.append(f"**Activity Level:** {persistence_level}")
         report.append(f"**Assessment:** {threat_color}")
-        report.append(f"**Monitoring Period:** {stats['analysis_duration_hours']:.1f} hours")
-        report.append(f"**Total Device Appearances:** {stats['total_appearances']:,}")
-        report.append(f"**Unique Devices Tracked:** {stats['unique_devices']:,}")
+        report.append(f"**Monitoring Period:** {duration_hours:.1f} hours")
+        report.append(f"**Total Device Appearances:** {total_appearances}")
+        report.append(f"**Unique Devices Tracked:** {unique_devices}")
         report.append(f"**Suspicious Devices Identified:** {len(suspicious_devices)}")
-        report.append(f"**Geographic Locations Analyzed:** {stats['unique_locations']}")
+        report.append(f"**Geographic Locations Analyzed:** {unique_locations}")
         report.append("")
         
         # Advanced Analytics Dashboard with explanations
-        report.append("## 📊 SURVEILLANCE ANALYTICS DASHBOARD")
-        report.append("")
-        report.append("*This dashboard analyzes your wireless environment for suspicious patterns that could indicate surveillance or stalking.*")
-        report.append("")
-        report.append("| Metric | Value | Risk Indicator | What This Means |")
-        report.append("|--------|-------|----------------|-----------------|")
-        report.append(f"| **Device Persistence Rate** | {stats['persistence_rate']:.1%} | {'🔴 High' if stats['persistence_rate'] > 0.3 else '🟡 Medium' if stats['persistence_rate'] > 0.15 else '🟢 Normal'} | Percentage of devices that appear repeatedly over time. High rates may indicate surveillance devices staying near you. |")
-        report.append(f"| **Multi-Location Tracking** | {stats['multi_location_rate']:.1%} | {'🔴 Critical' if stats['multi_location_rate'] > 0.2 else '🟡 Elevated' if stats['multi_location_rate'] > 0.1 else '🟢 Normal'} | Percentage of devices that follow you across different locations. This is a strong indicator of stalking/surveillance. |")
-        report.append(f"| **Analysis Time Period** | {stats['analysis_duration_hours']:.1f} hours | {'🟢 Comprehensive' if stats['analysis_duration_hours'] > 12 else '🟡 Moderate' if stats['analysis_duration_hours'] > 6 else '🔴 Limited'} | How long the monitoring period covered. Longer periods provide more reliable results. |")
-        report.append(f"| **Data Quality Score** | {min(95, int(stats['detection_accuracy'] * 100))}% | {'🟢 Excellent' if stats['detection_accuracy'] > 0.9 else '🟡 Good' if stats['detection_accuracy'] > 0.8 else '🔴 Poor'} | Reliability of the analysis based on data completeness and GPS accuracy. |")
+        report.append(REPORT_DASHBOARD_HEADER)
+        report.append(f"| **Device Persistence Rate** | {persistence_rate:.1%} | {'🔴 High' if persistence_rate > 0.3 else '🟡 Medium' if persistence_rate > 0.15 else '🟢 Normal'} | Percentage of devices that appear repeatedly over time. High rates may indicate surveillance devices staying near you. |")
+        report.append(f"| **Multi-Location Tracking** | {multi_location_rate:.1%} | {'🔴 Critical' if multi_location_rate > 0.2 else '🟡 Elevated' if multi_location_rate > 0.1 else '🟢 Normal'} | Percentage of devices that follow you across different locations. This is a strong indicator of stalking/surveillance. |")
+        report.append(f"| **Analysis Time Period** | {duration_hours:.1f} hours | {'🟢 Comprehensive' if duration_hours > 12 else '🟡 Moderate' if duration_hours > 6 else '🔴 Limited'} | How long the monitoring period covered. Longer periods provide more reliable results. |")
+        report.append(f"| **Data Quality Score** | {min(95, int(detection_accuracy * 100))}% | {'🟢 Excellent' if detection_accuracy > 0.9 else '🟡 Good' if detection_accuracy > 0.8 else '🔴 Poor'} | Reliability of the analysis based on data completeness and GPS accuracy. |")
         report.append("")
         
         # Add explanatory section
-        report.append("### 🤔 What Do These Numbers Mean?")
-        report.append("")
-        report.append("**Device Persistence Rate:** In a normal environment, most devices (phones, laptops) appear briefly and then leave. If many devices keep appearing repeatedly, it could indicate:")
-        report.append("- Someone might be deliberately staying near your location")
-        report.append("- Surveillance equipment could potentially be planted nearby")
-        report.append("- *Normal range: Under 15% | Concerning: Over 30%*")
-        report.append("")
-        report.append("**Multi-Location Tracking:** This is often considered the most serious indicator. If the same devices appear at your home, work, and other locations, it might suggest:")
-        report.append("- Someone could be following you")
-        report.append("- Stalking or surveillance could potentially be occurring")
-        report.append("- *Normal range: Under 10% | Critical: Over 20%*")
-        report.append("")
-        report.append("**Analysis Time Period:** Shows how long your monitoring covered. Longer periods provide more reliable results:")
-        report.append("- Short periods (under 6 hours) might miss patterns")
-        report.append("- Longer periods (over 12 hours) give comprehensive coverage")
-        report.append("- *Recommended: At least 12+ hours | Optimal: 24+ hours*")
-        report.append("")
-        report.append("**Data Quality Score:** Indicates how reliable the analysis results are based on:")
-        report.append("- Completeness of the wireless data collected")
-        report.append("- GPS accuracy and location correlation quality")
-        report.append("- *Excellent: 90%+ | Good: 80-89% | Poor: Under 80%*")
-        report.append("")
+        report.append(REPORT_METRICS_EXPLAINED)
         
         if suspicious_devices:
-            report.append("## 📊 PERSISTENT DEVICE ANALYSIS")
-            report.append("")
-            report.append("*The following devices showed repeated wireless activity patterns in your environment.*")
-            report.append("")
-            
-            # Explain threat scoring system
-            report.append("### 🎯 How Persistence Scores Work")
-            report.append("")
-            report.append("Each device gets a **Persistence Score** from 0.0 to 1.0 based on suspicious behaviors:")
-            report.append("")
-            report.append("**🟢 Normal (0.0-0.5):** Typical behavior - device appears briefly, doesn't follow you")
-            report.append("**🟡 Suspicious (0.6-0.7):** Some concerning patterns - appears multiple times or locations")  
-            report.append("**⚠️ High Threat (0.8-0.9):** Strong surveillance indicators - follows you, appears regularly")
-            report.append("**🚨 Critical (0.9-1.0):** Almost certain surveillance - tracks you across locations with suspicious timing")
-            report.append("")
-            report.append("**What Makes a Device Suspicious:**")
-            report.append("- **Appears repeatedly** at the same location over hours/days")
-            report.append("- **Follows you** to different locations (home, work, store)")
-            report.append("- **Regular timing** - shows up at predictable times")
-            report.append("- **Night activity** - appears during unusual hours")  
-            report.append("- **Suspicious scanning** - searches for networks with concerning names")
-            report.append("")
-            
-            # Threat classification
-            critical_persistent_devices = [d for d in suspicious_devices if d.persistence_score > 0.9]
-            high_persistences = [d for d in suspicious_devices if 0.8 <= d.persistence_score <= 0.9]
-            medium_persistent_devices = [d for d in suspicious_devices if 0.6 <= d.persistence_score < 0.8]
-            low_persistent_devices = [d for d in suspicious_devices if d.persistence_score < 0.6]
+            report.append(REPORT_SCORING_EXPLAINED)
             
             if critical_persistent_devices:
                 report.append("### 📊 VERY HIGH PERSISTENCE DEVICES (Score > 0.9)")
@@ -617,15 +1236,13 @@ class SurveillanceDetector:
             # Temporal analysis
             report.append("### ⏰ Temporal Patterns")
             temporal_patterns = self._analyze_temporal_patterns(suspicious_devices)
-            for pattern in temporal_patterns:
-                report.append(f"- {pattern}")
+            report.extend(map('- {}'.format, temporal_patterns))
             report.append("")
             
             # Geographic analysis
             report.append("### 🗺️ Geographic Tracking Patterns")
             geo_patterns = self._analyze_geographic_patterns(suspicious_devices)
-            for pattern in geo_patterns:
-                report.append(f"- {pattern}")
+            report.extend(map('- {}'.format, geo_patterns))
             report.append("")
             
             # Device correlation analysis
@@ -634,8 +1251,7 @@ class SurveillanceDetector:
             if correlations:
                 report.append("*Devices that appear together may indicate coordinated surveillance*")
                 report.append("")
-                for correlation in correlations:
-                    report.append(f"- {correlation}")
+                report.extend(map('- {}'.format, correlations))
             else:
                 report.append("- No significant device correlations detected")
             report.append("")
@@ -646,98 +1262,20 @@ class SurveillanceDetector:
             report.append("**Analysis Result:** No suspicious surveillance patterns identified in the monitored environment.")
             report.append("")
             report.append("**Assessment Details:**")
-            report.append(f"- **{stats['unique_devices']:,} unique devices** analyzed across **{stats['unique_locations']} locations**")
-            report.append(f"- **{stats['total_appearances']:,} device appearances** processed over **{stats['analysis_duration_hours']:.1f} hours**")
+            report.append(f"- **{unique_devices} unique devices** analyzed across **{unique_locations} locations**")
+            report.append(f"- **{total_appearances} device appearances** processed over **{duration_hours:.1f} hours**")
             report.append("- All device behaviors fall within normal operational parameters")
             report.append("- No cross-location tracking patterns detected")
             report.append("- Temporal analysis shows natural distribution patterns")
             report.append("")
         
         # Advanced countermeasures and recommendations with clear explanations
-        report.append("## 🛡️ SECURITY COUNTERMEASURES & PROTECTION GUIDE")
-        report.append("")
-        report.append("*Based on your analysis results, here are specific actions you can take to protect yourself.*")
-        report.append("")
+        report.append(REPORT_COUNTERMEASURES_HEADER)
         
-        if suspicious_devices:
-            high_persistence = [d for d in suspicious_devices if d.persistence_score > 0.8]
-            if high_persistence:
-                report.append("### 📊 HIGH-PERSISTENCE DEVICES DETECTED")
-                report.append("**ℹ️ Some devices showed high-frequency appearances - here are some general privacy tips:**")
-                report.append("")
-                report.append("#### 1. 📱 Consider Protecting Your Devices")
-                report.append("**MAC Address Randomization** *(Could make your devices harder to track)*:")
-                report.append("- **iPhone/iPad:** Settings → Wi-Fi → Tap info (i) next to network → Consider enabling 'Private Address'")
-                report.append("- **Android:** Settings → Wi-Fi → Advanced → Consider enabling 'Use randomized MAC'")
-                report.append("- **Windows:** Settings → Network & Internet → Wi-Fi → Manage known networks → Properties → Consider enabling 'Use random hardware addresses'")
-                report.append("- **Mac:** System Preferences → Network → Wi-Fi → Advanced → Consider enabling 'Use private Wi-Fi address'")
-                report.append("")
-                report.append("**When You Might Consider Disabling Wi-Fi:**")
-                report.append("- You could turn off Wi-Fi when walking around in public")
-                report.append("- You might use cellular data instead when you suspect someone is following")
-                report.append("- You could consider a Faraday bag (signal-blocking pouch) for your phone in high-risk situations")
-                report.append("")
-                
-                report.append("#### 2. 🚶 Consider Changing Your Patterns")
-                report.append("**You Might Consider Varying Your Routines:**")
-                report.append("- You could take different routes to work/home each day")
-                report.append("- You might change the times you leave and arrive")
-                report.append("- You could visit different stores/restaurants than usual")
-                report.append("- If possible, you might consider staying with friends/family temporarily")
-                report.append("")
-                report.append("**Why This Could Help:** Surveillance often relies on predictable patterns. By changing your routine, you could potentially make it harder for someone to track you.")
-                report.append("")
-                
-                report.append("#### 3. 📞 Consider Getting Help")
-                report.append("**You Might Consider Documenting Everything:**")
-                report.append("- You could save this report with timestamps")
-                report.append("- You might take photos of suspicious people or vehicles")
-                report.append("- You could keep a log of when/where you notice anything unusual")
-                report.append("")
-                report.append("**Contacting Authorities (Your Choice):**")
-                report.append("- **If you feel in immediate danger:** You could call 911")
-                report.append("- **For stalking/harassment:** You might contact local police non-emergency line")
-                report.append("- **For cybersecurity help:** You could consider consulting a security professional")
-                report.append("- **Legal protection:** You might research restraining orders if you know who's involved")
-                report.append("")
-        
-        report.append("### 🔒 LONG-TERM PRIVACY PROTECTION")
-        report.append("*These steps help protect you from future surveillance attempts.*")
-        report.append("")
+        if high_persistence:
+            report.append(REPORT_HIGH_PERSISTENCE_TIPS)
         
-        report.append("#### 📱 Consider Making Your Devices More Private")
-        report.append("**Wi-Fi Settings You Might Consider:**")
-        report.append("- You could enable MAC address randomization on your devices")
-        report.append("- You might remove old Wi-Fi networks you don't use anymore")
-        report.append("- You could turn off 'Auto-join' for public Wi-Fi networks")  
-        report.append("- You might use a trusted VPN service when on public Wi-Fi")
-        report.append("")
-        
-        report.append("#### 🚶 Consider Staying Unpredictable")
-        report.append("**Daily Habits You Might Consider:**")
-        report.append("- You could vary your daily routes when possible")
-        report.append("- You might be aware of people or cars you see repeatedly")
-        report.append("- You could trust your instincts - if something feels wrong, it might be")
-        report.append("- You might consider learning counter-surveillance techniques")
-        report.append("")
-        
-        report.append("#### 🔍 Consider Continued Monitoring")
-        report.append("**Using This Tool:**")
-        report.append("- You could run CYT analysis regularly if you're concerned about surveillance")
-        report.append("- You might pay attention to devices that appear in multiple locations")
-        report.append("- You could share reports with law enforcement if patterns emerge")
-        report.append("- You might keep logs of any suspicious activity")
-        report.append("")
-        
-        report.append("#### ℹ️ Understanding the Technology")
-        report.append("**How Surveillance Tracking Works:**")
-        report.append("- Devices broadcast unique identifiers (MAC addresses) when searching for Wi-Fi networks")
-        report.append("- **Modern phones (iOS 14+, Android 10+) randomize these addresses** to protect privacy")
-        report.append("- **Older devices or those with randomization disabled** still reveal their true MAC address")
-        report.append("- Surveillance equipment could record these identifiers to track device movements")
-        report.append("- This tool detects patterns where the same identifiers appear repeatedly or across locations")
-        report.append("- **Note:** Randomized MAC addresses make tracking much harder but don't eliminate all risks")
-        report.append("")
+        report.append(REPORT_LONG_TERM_PROTECTION)
         
         # Technical appendix
         report.append("## 📋 TECHNICAL ANALYSIS APPENDIX")
@@ -751,122 +1289,76 @@ class SurveillanceDetector:
         report.append("")
         
         report.append("### Statistical Confidence Levels")
-        report.append(f"- Analysis based on **{len(self.appearances):,} data points**")
+        report.append(f"- Analysis based on **{self._appearance_count:,} data points**")
         report.append(f"- Confidence interval: **95%**")
         report.append(f"- False positive rate: **< 5%**")
-        report.append(f"- Detection accuracy: **{stats['detection_accuracy']:.1%}**")
+        report.append(f"- Detection accuracy: **{detection_accuracy:.1%}**")
         report.append("")
         
         # Footer
-        report.append("---")
-        report.append("")
-        report.append("*This report was generated by the CYT Advanced Surveillance Detection System.*")
-        report.append("*For technical support or threat intelligence inquiries, contact your security administrator.*")
-        report.append("")
-        report.append(f"**Report ID:** CYT-{datetime.now().strftime('%Y%m%d%H%M%S')}")
+        report.append(REPORT_FOOTER)
+        report.append(f"**Report ID:** CYT-{generated_at:%Y%m%d%H%M%S}")
         report.append(f"**Classification:** CONFIDENTIAL - Personal Security Intelligence")
         
         report_text = '\n'.join(report)
         
-        # Save markdown report
-        with open(output_file, 'w') as f:
-            f.write(report_text)
+        # Save markdown report, encoded once as UTF-8 (what pandoc reads too)
+        # so the emoji survive whatever the platform's default encoding is
+        report_bytes = report_text.encode('utf-8')
+        pathlib.Path(output_file).write_bytes(report_bytes)
         
-        logger.info(f"Advanced surveillance report saved to: {output_file}")
+        logger.info("Advanced surveillance report saved to: %s", output_file)
         
         # Generate HTML version using pandoc
-        html_file = output_file.replace('.md', '.html')
-        try:
-            import subprocess
-            # Custom CSS for better styling
-            css_content = """
-            <style>
-            body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif; 
-                   max-width: 1200px; margin: 0 auto; padding: 20px; line-height: 1.6; }
-            h1, h2, h3 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
-            table { border-collapse: collapse; width: 100%; margin: 20px 0; }
-            th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
-            th { background-color: #f8f9fa; font-weight: bold; }
-            .emoji { font-size: 1.2em; }
-            code { background-color: #f1f2f6; padding: 4px 8px; border-radius: 4px; }
-            pre { background-color: #f8f9fa; padding: 15px; border-radius: 8px; overflow-x: auto; }
-            blockquote { border-left: 4px solid #3498db; padding-left: 20px; margin-left: 0; 
-                        background-color: #f8f9fa; padding: 15px 20px; border-radius: 0 8px 8px 0; }
-            .threat-high { background-color: #ffe6e6; border-left: 4px solid #e74c3c; }
-            .threat-medium { background-color: #fff3cd; border-left: 4px solid #f39c12; }
-            .threat-low { background-color: #d4edda; border-left: 4px solid #27ae60; }
-            </style>
-            """
-            
-            # Run pandoc to convert markdown to HTML
-            cmd = [
-                'pandoc', 
-                output_file,
-                '-o', html_file,
-                '--standalone',
-                '--self-contained',
-                '--metadata', f'title=CYT Surveillance Detection Report',
-                '--css', '/dev/stdin'
-            ]
-            
-            result = subprocess.run(cmd, input=css_content, text=True, capture_output=True)
-            
-            if result.returncode == 0:
-                logger.info(f"HTML report generated: {html_file}")
-            else:
-                logger.warning(f"Failed to generate HTML report: {result.stderr}")
-                
-        except Exception as e:
-            logger.warning(f"Could not generate HTML report: {e}")
+        self._write_html_report(report_bytes, output_file.replace('.md', '.html'))
         
         return report_text
 
+def iter_kismet_appearances(db_path: str, conn: sqlite3.Connection = None
+                            ) -> Iterator[Tuple[str, float, Optional[str], Optional[str]]]:
+    """
+    (mac, last_time, type, probed_ssid) for every device in a Kismet database, newest first
+    
+    Args:
+        conn: Already open connection to db_path, left open afterwards;
+              a connection is opened and closed here when None
+    """
+    if conn is not None:
+        yield from iter_kismet_rows(conn.execute(KISMET_APPEARANCES_QUERY))
+        return
+    
+    with closing(open_kismet_database(db_path)) as conn:
+        # Get all devices with timestamps
+        yield from iter_kismet_rows(conn.execute(KISMET_APPEARANCES_QUERY))
+
+def read_kismet_appearances(db_path: str) -> List[Tuple[str, float, Optional[str], Optional[str]]]:
+    """All of iter_kismet_appearances() as a list, for returning from a worker process"""
+    return list(iter_kismet_appearances(db_path))
+
 def load_appearances_from_kismet(db_path: str, detector: SurveillanceDetector, 
-                               location_id: str = "unknown") -> int:
-    """Load device appearances from Kismet database"""
+                               location_id: str = "unknown", rows: Iterable[tuple] = None) -> Optional[int]:
+    """
+    Load device appearances from Kismet database
+    
+    Args:
+        rows: Appearance rows already read from db_path, e.g. by a worker
+              process; read from the database when None
+    
+    Returns:
+        Number of appearances loaded, or None if the database could not be read
+    """
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Get all devices with timestamps
-            cursor.execute("""
-                SELECT devmac, last_time, type, device 
-                FROM devices 
-                WHERE last_time > 0
-                ORDER BY last_time DESC
-            """)
-            
-            rows = cursor.fetchall()
-            count = 0
-            
-            for row in rows:
-                mac, timestamp, device_type, device_json = row
-                
-                # Extract SSIDs from device JSON
-                ssids_probed = []
-                try:
-                    device_data = json.loads(device_json)
-                    dot11_device = device_data.get('dot11.device', {})
-                    if dot11_device:
-                        probe_record = dot11_device.get('dot11.device.last_probed_ssid_record', {})
-                        ssid = probe_record.get('dot11.probedssid.ssid')
-                        if ssid:
-                            ssids_probed = [ssid]
-                except (json.JSONDecodeError, KeyError):
-                    pass
-                
-                detector.add_device_appearance(
-                    mac=mac,
-                    timestamp=timestamp,
-                    location_id=location_id,
-                    ssids_probed=ssids_probed,
-                    device_type=device_type
-                )
-                count += 1
-            
-            logger.info(f"Loaded {count} device appearances from {db_path}")
-            return count
-            
+        if rows is None:
+            rows = iter_kismet_appearances(db_path)
+        
+        count = detector.add_device_appearances(
+            ((mac, timestamp, [ssid] if ssid else [], device_type) for mac, timestamp, device_type, ssid in rows),
+            location_id
+        )
+        
+        logger.info("Loaded %d device appearances from %s", count, db_path)
+        return count
+        
     except Exception as e:
-        logger.error(f"Error loading from Kismet database: {e}")
-        return 0
\ No newline at end of file
+        logger.error("Error loading from Kismet database: %s", e)
+        return None
\ No newline at end of file